@@ -216,6 +216,21 @@ DATABASE_ROUTERS = [
     "core.config.routers.InvestigationsRouter",
 ]
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_REDIS_URL", "redis://result:6379/2"),
+    }
+}
+
+# Sorted set with the XP of every user, see core.services.leaderboard
+LEADERBOARD_REDIS_URL = os.getenv(
+    "LEADERBOARD_REDIS_URL", CACHES["default"]["LOCATION"]
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -291,6 +306,11 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        "core.services.connection_pool": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
@@ -340,6 +360,57 @@ CELERY_TASK_TIME_LIMIT = 30
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TASK_SERIALIZER = "json"
 CELERY_ACCEPT_CONTENT = ["json"]
+
+# With lazy progress a missing UserProgress row means "не начато" and rows
+# are only created when a player first works on a case
+USER_PROGRESS_LAZY = os.getenv("USER_PROGRESS_LAZY") == "true"
+
+# Progress rows for a new case are created by a Celery task once there are
+# at least this many users; 0 keeps the fan-out inside the saving transaction
+USER_PROGRESS_ASYNC_FAN_OUT_MIN_USERS = int(
+    os.getenv("USER_PROGRESS_ASYNC_FAN_OUT_MIN_USERS", 0)
+)
+
+# SQL executor settings
+# Defaults for player queries; any of them can be overridden per case
+# through the matching users.Case field.
+SQL_QUERY_LIMITS = {
+    "statement_timeout": 5000,  # ms
+    "work_mem": 16 * 1024,  # kB
+    "max_rows": 1000,
+    "max_bytes": 2 * 1024 * 1024,
+    "max_cost": 500_000,  # planner cost units
+    "max_plan_rows": 1_000_000,
+}
+# Pooled read-only connections used for player queries. Point the
+# credentials at a low-privilege role that only has SELECT on the
+# investigations tables; without one the owner role is used with a warning.
+SQL_PLAYER_POOL = {
+    "USER": os.getenv("POSTGRES_PLAYER_USER"),
+    "PASSWORD": os.getenv("POSTGRES_PLAYER_PASSWORD"),
+    "MIN_SIZE": int(os.getenv("SQL_PLAYER_POOL_MIN_SIZE", 1)),
+    "MAX_SIZE": int(os.getenv("SQL_PLAYER_POOL_MAX_SIZE", 4)),
+    "TIMEOUT": 5,  # seconds to wait for a free connection
+    "CONNECT_TIMEOUT": 3,  # seconds to wait for the server to accept one
+    "HEALTH_CHECK_INTERVAL": 30,  # seconds idle before a connection is pinged
+    "METRICS_INTERVAL": 60,  # seconds between wait time/utilisation logs
+}
+# Queries cheaper than this run inline in the web process, see run_inline
+SQL_INLINE_MAX_COST = int(os.getenv("SQL_INLINE_MAX_COST", 1000))
+SQL_INLINE_STATEMENT_TIMEOUT = int(os.getenv("SQL_INLINE_STATEMENT_TIMEOUT", 200))  # ms
+SQL_TASK_MAX_WAIT = 25  # s, longest TaskStatusView long poll
+SQL_RETRY_AFTER = 5  # s, Retry-After when the investigations DB is unreachable
+SQL_MAX_LIMIT = int(os.getenv("SQL_MAX_LIMIT", 10000))
+SQL_PAGE_TOKEN_MAX_AGE = 60 * 60
+SQL_VALIDATION_CACHE_SIZE = int(os.getenv("SQL_VALIDATION_CACHE_SIZE", 4096))
+SQL_VALIDATION_CACHE_SHARED = os.getenv("SQL_VALIDATION_CACHE_SHARED") == "true"
+SQL_VALIDATION_CACHE_TIMEOUT = 60 * 60
+SQL_RESULT_CACHE_TIMEOUT = 60 * 60
+SQL_PLAN_CACHE_TIMEOUT = 60 * 60
+SQL_ACCESS_CACHE_TIMEOUT = 60  # s, cached case rows and user XP
+SQL_SCHEMA_CACHE_SIZE = int(os.getenv("SQL_SCHEMA_CACHE_SIZE", 256))
+SQL_SCHEMA_CACHE_TIMEOUT = 24 * 60 * 60  # s, shared schema snapshots
+SQL_RESULT_CACHE_MAX_BYTES = int(os.getenv("SQL_RESULT_CACHE_MAX_BYTES", 512 * 1024))
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
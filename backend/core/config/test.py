@@ -9,6 +9,15 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# No Redis in tests: incremental leaderboard updates are skipped
+LEADERBOARD_REDIS_URL = ""
+
 STORAGES = {
     "default": {
         "BACKEND": "django.core.files.storage.FileSystemStorage",
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class InvestigationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core.investigations"
+
+    def ready(self):
+        from core.services.schema_creator import bump_schema_version
+
+        # Used by the schema service to find help texts for table columns.
+        self.models_by_table = {
+            model._meta.db_table: model for model in self.get_models()
+        }
+
+        # Table layouts only change through migrations.
+        post_migrate.connect(bump_schema_version, sender=self)
@@ -0,0 +1,103 @@
+import time
+
+from core.management.benchmark import rolled_back
+from core.services.generator.copy_writer import CopyWriter
+from core.services.generator.data_generator import (
+    DEFAULT_BATCH_SIZE,
+    InvestigationsDataGenerator,
+)
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет скорость генерации данных investigations (строк в секунду "
+        "по этапам) при разном числе персон. Все изменения откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--persons",
+            type=int,
+            nargs="+",
+            default=[1_500, 150_000, 1_500_000],
+            help="Число персон в прогонах",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Количество строк в одном INSERT (1 — построчная вставка)",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Измерить загрузку через COPY вместо bulk_create",
+        )
+
+    def handle(self, *args, **options):
+        runs = {}
+        for persons in options["persons"]:
+            if options["copy"]:
+                self.stdout.write(f"{persons} persons, COPY")
+                runs[persons] = self.measure_copy(persons)
+            else:
+                self.stdout.write(
+                    f"{persons} persons, batch size {options['batch_size']}"
+                )
+                runs[persons] = self.measure(persons, options["batch_size"])
+            for stage, rows, elapsed in runs[persons]:
+                rate = rows / elapsed if elapsed else 0
+                self.stdout.write(
+                    f"  {stage:<22} {rows:>10} rows {elapsed:8.2f} s "
+                    f"{rate:>10.0f} rows/s"
+                )
+        self.write_scaling(runs)
+
+    def write_scaling(self, runs):
+        # With linear generation the cost per row stays flat as the
+        # dataset grows; a quadratic stage shows up as a growing column.
+        self.stdout.write("Cost per row, us")
+        self.stdout.write(
+            f"  {'stage':<22}" + "".join(f"{persons:>12}" for persons in runs)
+        )
+        stages = [stage for stage, _, _ in next(iter(runs.values()))]
+        for index, stage in enumerate(stages):
+            costs = []
+            for results in runs.values():
+                _, rows, elapsed = results[index]
+                costs.append(f"{elapsed / rows * 1e6:>12.1f}" if rows else f"{'-':>12}")
+            self.stdout.write(f"  {stage:<22}" + "".join(costs))
+
+    def measure_copy(self, persons):
+        writer = CopyWriter(
+            persons=persons, suspects=persons // 3, charges=persons // 15
+        )
+        with rolled_back("investigations"):
+            return writer.run()
+
+    def measure(self, persons, batch_size):
+        generator = InvestigationsDataGenerator(batch_size=batch_size)
+        # Same proportions as the generate_investigations defaults.
+        stages = [
+            ("persons", generator.generate_persons, [persons], "persons"),
+            ("cases", generator.generate_cases, [], "cases"),
+            ("suspects", generator.generate_suspects, [persons // 3], "suspects"),
+            ("case_suspect", generator.generate_case_suspect, [], "case_suspects"),
+            ("articles", generator.generate_articles, [], "articles"),
+            ("charges", generator.generate_charges, [persons // 15], "charges"),
+            ("alibis", generator.generate_alibis, [], "alibis"),
+            ("statements", generator.generate_statements, [], "statements"),
+            ("crime_scenes", generator.generate_crime_scenes, [], "scenes"),
+            ("evidence", generator.generate_evidence, [], "evidence"),
+        ]
+
+        results = []
+        with rolled_back("investigations"):
+            generator.clear_all_data()
+            for stage, generate, args, attr in stages:
+                start = time.perf_counter()
+                generate(*args)
+                elapsed = time.perf_counter() - start
+                results.append((stage, len(getattr(generator, attr)), elapsed))
+        return results
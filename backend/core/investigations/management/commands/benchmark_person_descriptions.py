@@ -0,0 +1,45 @@
+import time
+
+from core.services.generator.utils.utils import (
+    get_description,
+    get_descriptions,
+    get_job,
+    get_name,
+)
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет время генерации описаний персон: по одной и пакетом. "
+        "Имена и профессии генерируются заранее и в замер не входят."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--persons", type=int, default=100_000, help="Количество персон"
+        )
+        parser.add_argument("--rounds", type=int, default=3, help="Количество прогонов")
+
+    def handle(self, *args, **options):
+        count = options["persons"]
+        names = [get_name() for _ in range(count)]
+        jobs = [get_job() for _ in range(count)]
+
+        generators = [
+            (
+                "per person",
+                lambda: [get_description(n, j) for n, j in zip(names, jobs)],
+            ),
+            ("batched", lambda: get_descriptions(names, jobs)),
+        ]
+        for label, generate in generators:
+            elapsed = min(self.measure(generate) for _ in range(options["rounds"]))
+            self.stdout.write(
+                f"{label:<12} {elapsed:8.2f} s  {elapsed / count * 1e6:8.2f} us/person"
+            )
+
+    def measure(self, generate):
+        start = time.perf_counter()
+        generate()
+        return time.perf_counter() - start
@@ -0,0 +1,98 @@
+import statistics
+import time
+
+from core.services.schema_creator import get_schema
+from core.users.models import AvailableTable
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+_LEGACY_COLUMNS_QUERY = """
+    SELECT
+        c.column_name,
+        c.data_type,
+        EXISTS (
+            SELECT 1
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu
+                ON tc.constraint_name = kcu.constraint_name
+            WHERE tc.table_name = %s
+                AND kcu.column_name = c.column_name
+                AND tc.constraint_type = 'PRIMARY KEY'
+        ) AS is_primary,
+        EXISTS (
+            SELECT 1
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu
+                ON tc.constraint_name = kcu.constraint_name
+            WHERE tc.table_name = %s
+                AND kcu.column_name = c.column_name
+                AND tc.constraint_type = 'FOREIGN KEY'
+        ) AS is_foreign
+    FROM information_schema.columns c
+    WHERE c.table_name = %s;
+"""
+
+_LEGACY_FOREIGN_KEYS_QUERY = """
+    SELECT
+        kcu.column_name AS from_column,
+        ccu.table_name AS to_table,
+        ccu.column_name AS to_column
+    FROM
+        information_schema.table_constraints AS tc
+    JOIN information_schema.key_column_usage AS kcu
+        ON tc.constraint_name = kcu.constraint_name
+    JOIN information_schema.constraint_column_usage AS ccu
+        ON ccu.constraint_name = tc.constraint_name
+    WHERE constraint_type = 'FOREIGN KEY' AND tc.table_name = %s;
+"""
+
+
+def _legacy_get_schema(case_id):
+    allowed_tables = list(
+        AvailableTable.objects.filter(case_id=case_id).values_list("table", flat=True)
+    )
+    with connections["investigations"].cursor() as cursor:
+        for table in allowed_tables:
+            cursor.execute(_LEGACY_COLUMNS_QUERY, [table, table, table])
+            cursor.fetchall()
+            cursor.execute(_LEGACY_FOREIGN_KEYS_QUERY, [table])
+            cursor.fetchall()
+
+
+class Command(BaseCommand):
+    help = "Измеряет время построения схемы дела без кэша (до и после)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rounds", type=int, default=20, help="Количество прогонов по делам"
+        )
+
+    def handle(self, *args, **options):
+        case_ids = list(
+            AvailableTable.objects.values_list("case_id", flat=True).distinct()
+        )
+        if not case_ids:
+            self.stdout.write(self.style.WARNING("Нет дел с доступными таблицами."))
+            return
+
+        introspections = [
+            ("information_schema", _legacy_get_schema),
+            ("pg_catalog batched", get_schema),
+        ]
+        for label, introspect in introspections:
+            timings = self.measure(introspect, case_ids, options["rounds"])
+            self.stdout.write(
+                f"{label:<20} "
+                f"mean={statistics.fmean(timings) * 1e3:8.2f} ms  "
+                f"p50={statistics.median(timings) * 1e3:8.2f} ms  "
+                f"max={max(timings) * 1e3:8.2f} ms"
+            )
+
+    def measure(self, introspect, case_ids, rounds):
+        timings = []
+        for _ in range(rounds):
+            for case_id in case_ids:
+                start = time.perf_counter()
+                introspect(case_id)
+                timings.append(time.perf_counter() - start)
+        return timings
@@ -1,4 +1,9 @@
-from core.services.generator.data_generator import InvestigationsDataGenerator
+from core.services.generator.copy_writer import CopyWriter
+from core.services.generator.data_generator import (
+    DEFAULT_BATCH_SIZE,
+    InvestigationsDataGenerator,
+)
+from core.services.result_cache import bump_dataset_version
 from django.core.management.base import BaseCommand
 
 
@@ -15,16 +20,28 @@ class Command(BaseCommand):
         parser.add_argument(
             "--charges", type=int, default=100, help="Количество обвинений"
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Количество строк в одном INSERT",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Загрузить данные через COPY без создания моделей (только PostgreSQL)",
+        )
         parser.add_argument(
             "--clear", action="store_true", help="Очистить все данные и выйти"
         )
 
     def handle(self, *args, **options):
-        generator = InvestigationsDataGenerator()
+        generator = InvestigationsDataGenerator(batch_size=options["batch_size"])
 
         if options["clear"]:
             self.stdout.write(self.style.WARNING("Очищаем данные investigations..."))
             generator.clear_all_data()
+            bump_dataset_version()
             self.stdout.write(self.style.SUCCESS("Данные успешно очищены."))
             return
         
@@ -35,9 +52,16 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.WARNING("Генерация новых данных...")
         )
-        generator.run(
-            persons=options["persons"],
-            suspects=options["suspects"],
-            charges=options["charges"],
-        )
+        if options["copy"]:
+            CopyWriter(
+                persons=options["persons"],
+                suspects=options["suspects"],
+                charges=options["charges"],
+            ).run()
+        else:
+            generator.run(
+                persons=options["persons"],
+                suspects=options["suspects"],
+                charges=options["charges"],
+            )
         self.stdout.write(self.style.SUCCESS("Генерация завершена успешно."))
@@ -1,4 +1,5 @@
 from core.services.case_loader.case_loader import load_all_cases
+from core.services.schema_creator import warm_schema_cache
 from core.users.models import Case as UserCase
 from django.core.management.base import BaseCommand
 from django.db import connections
@@ -35,6 +36,9 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS(f"Новых дел: {loaded}"))
         self.stdout.write(self.style.SUCCESS(f"Загружено ранее: {skipped}"))
+        self.stdout.write(
+            self.style.SUCCESS(f"Схем дел подготовлено: {warm_schema_cache()}")
+        )
 
     def reset_sequences(self, table_names):
         with connections["users"].cursor() as cursor:
@@ -0,0 +1,23 @@
+"""
+Helpers shared by the benchmark_* management commands.
+
+Benchmarks keep the implementation they replaced as ``_legacy_*``
+functions, so both can be measured on the same data.
+"""
+
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def rolled_back(using):
+    """
+    Run the block in a transaction on ``using`` that is always rolled back.
+
+    Callbacks registered with transaction.on_commit inside the block are
+    discarded with it.
+    """
+    with transaction.atomic(using=using):
+        yield
+        transaction.set_rollback(True, using=using)
@@ -0,0 +1,44 @@
+from core.users.models import Case, User
+from django.conf import settings
+from django.core.cache import cache
+
+CASE_KEY = "access:case:{case_id}"
+USER_XP_KEY = "access:user_xp:{user_id}"
+
+
+def get_case(case_id) -> Case:
+    """
+    Return a case row, cached for SQL_ACCESS_CACHE_TIMEOUT seconds.
+
+    Raises:
+        Case.DoesNotExist: If there is no such case.
+    """
+    key = CASE_KEY.format(case_id=case_id)
+    case = cache.get(key)
+    if case is None:
+        case = Case.objects.get(pk=case_id)
+        cache.set(key, case, settings.SQL_ACCESS_CACHE_TIMEOUT)
+    return case
+
+
+def invalidate_case(case_id) -> None:
+    cache.delete(CASE_KEY.format(case_id=case_id))
+
+
+def get_user_xp(user_id) -> int:
+    """
+    Return the XP of a user, cached for SQL_ACCESS_CACHE_TIMEOUT seconds.
+
+    Raises:
+        User.DoesNotExist: If there is no such user.
+    """
+    key = USER_XP_KEY.format(user_id=user_id)
+    xp = cache.get(key)
+    if xp is None:
+        xp = User.objects.values_list("xp", flat=True).get(pk=user_id)
+        cache.set(key, xp, settings.SQL_ACCESS_CACHE_TIMEOUT)
+    return xp
+
+
+def invalidate_user_xp(*user_ids) -> None:
+    cache.delete_many([USER_XP_KEY.format(user_id=user_id) for user_id in user_ids])
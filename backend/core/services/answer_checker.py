@@ -1,31 +1,57 @@
-from core.users.models import Case, User, UserProgress
-from django.db import transaction
-
+from core.services import leaderboard
+from core.services.access_cache import invalidate_user_xp
+from core.services.answer_index import answer_index, answer_matches
+from core.services.resource_versions import bump_resource_version, user_progress
+from core.users.models import User, UserProgress
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def set_progress_status(user_id, case_id, status, unless) -> bool:
+    """
+    Move a progress row to ``status`` unless it is in one of ``unless``.
+
+    The change is a single conditional UPDATE, so of two concurrent calls
+    only one can succeed. A missing row is created with the new status.
+
+    Returns:
+        True if this call changed the status.
+    """
+    progress = UserProgress.objects.filter(user_id=user_id, case_id=case_id)
+    if progress.exclude(status__in=unless).update(status=status):
+        return True
+    if progress.exists():
+        return False
 
-def normalize_answer(answer):
-    return " ".join(str(answer).strip().lower().split())
+    try:
+        with transaction.atomic(using="users"):
+            UserProgress.objects.create(user_id=user_id, case_id=case_id, status=status)
+    except IntegrityError:
+        # Created concurrently, possibly with another status.
+        return bool(progress.exclude(status__in=unless).update(status=status))
+    return True
 
 
 @transaction.atomic(using="users")
 def check_answer(answer, case_id, user_id):
-    user = User.objects.get(pk=user_id)
-    case = Case.objects.get(pk=case_id)
-    progress, _ = UserProgress.objects.get_or_create(user=user, case=case)
-
-    normalized_answer = normalize_answer(answer)
-    is_correct = normalized_answer == normalize_answer(case.answer)
+    expected_digest, reward_xp = answer_index.get(case_id)
+    is_correct = answer_matches(answer, expected_digest)
 
     if is_correct:
-        if progress.status != "завершено":
-            progress.status = "завершено"
-            user.xp += case.reward_xp
-            progress.save(using="users")
-            user.save(using="users")
-
-        return True
-
-    if progress.status != "завершено":
-        progress.status = "в процессе"
-        progress.save(using="users")
-
-    return False
+        changed = set_progress_status(
+            user_id, case_id, "завершено", unless=["завершено"]
+        )
+        if changed:
+            User.objects.filter(pk=user_id).update(xp=F("xp") + reward_xp)
+            transaction.on_commit(lambda: invalidate_user_xp(user_id), using="users")
+            transaction.on_commit(lambda: leaderboard.sync_xp([user_id]), using="users")
+    else:
+        changed = set_progress_status(
+            user_id, case_id, "в процессе", unless=["в процессе", "завершено"]
+        )
+
+    if changed:
+        transaction.on_commit(
+            lambda: bump_resource_version(user_progress(user_id)), using="users"
+        )
+    return is_correct
@@ -0,0 +1,65 @@
+import hashlib
+import hmac
+import threading
+
+from core.services.resource_versions import CASES, get_resource_versions
+from core.users.models import Case
+
+
+def normalize_answer(answer):
+    return " ".join(str(answer).strip().lower().split())
+
+
+def answer_digest(answer) -> bytes:
+    return hashlib.sha256(normalize_answer(answer).encode()).digest()
+
+
+def answer_matches(answer, expected_digest: bytes) -> bool:
+    # Constant time, so response times leak nothing about the answer.
+    return hmac.compare_digest(answer_digest(answer), expected_digest)
+
+
+class AnswerIndex:
+    """
+    Process-local map of case id to the digest of its normalized answer
+    and its XP reward.
+
+    The index is stamped with the version of the case list, which signals
+    bump on every case change, and is reloaded in full when the stamp no
+    longer matches.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, case_id) -> tuple[bytes, int]:
+        """
+        Return the answer digest and XP reward of a case.
+
+        Raises:
+            Case.DoesNotExist: If there is no such case.
+        """
+        (version,) = get_resource_versions(CASES)
+        if version != self.version:
+            self.load(version)
+        try:
+            return self._entries[int(case_id)]
+        except KeyError:
+            raise Case.DoesNotExist(f"Case {case_id} does not exist") from None
+
+    def load(self, version) -> None:
+        with self._lock:
+            if version == self.version:
+                return
+            self._entries = {
+                case_id: (answer_digest(answer), reward_xp)
+                for case_id, answer, reward_xp in Case.objects.values_list(
+                    "id", "answer", "reward_xp"
+                )
+            }
+            self.version = version
+
+
+answer_index = AnswerIndex()
@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 from typing import final
 
 from core.investigations.models import Case as InvestigationCase
+from core.services.result_cache import bump_dataset_version
 from core.users.models import AvailableTable, Case
 from django.db import IntegrityError, transaction
 
@@ -14,6 +15,7 @@ class BaseCase(ABC):
     answer: str | int
     short_description: str
     available_tables: list[str]
+    query_limits: dict[str, int] = {}
 
     @final
     def create(self) -> bool:
@@ -27,6 +29,7 @@ class BaseCase(ABC):
                         "required_xp": self.required_xp,
                         "reward_xp": self.reward_xp,
                         "answer": self.answer,
+                        **self.query_limits,
                     },
                 )
 
@@ -43,6 +46,7 @@ class BaseCase(ABC):
                     raise RuntimeError("Расследование не создано")
 
                 case.save()
+                transaction.on_commit(bump_dataset_version, using="users")
                 return True
 
         except IntegrityError as e:
@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.pool import ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PlayerConnectionPool:
+    """
+    Bounded pool of read-only connections to the investigations database.
+
+    Callers block for a free slot up to ``timeout`` seconds instead of
+    failing immediately when the pool is exhausted. Connections idle for
+    longer than ``health_check_interval`` seconds are pinged before reuse
+    and replaced if they turn out to be broken. Wait time and utilisation
+    are logged every ``metrics_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        min_size,
+        max_size,
+        timeout,
+        health_check_interval,
+        metrics_interval,
+        **connect_kwargs,
+    ):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.metrics_interval = metrics_interval
+        self._metrics_logged_at = time.monotonic()
+        self._pool = ThreadedConnectionPool(min_size, max_size, **connect_kwargs)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "discarded": 0,
+            "in_use": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+        }
+
+    @contextmanager
+    def connection(self, timeout: float | None = None):
+        """
+        Check out a connection for the duration of the block.
+
+        The transaction is rolled back when the block exits, so session
+        state set with SET LOCAL never leaks to the next user.
+
+        Args:
+            timeout: Seconds to wait for a free connection instead of the
+                pool default; 0 does not wait at all.
+
+        Raises:
+            PoolTimeout: If no connection frees up within the timeout.
+        """
+        start = time.monotonic()
+        if timeout is None:
+            timeout = self.timeout
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout("Сервер перегружен, повторите запрос позже.")
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["wait_total"] += waited
+            self._stats["wait_max"] = max(self._stats["wait_max"], waited)
+
+        connection = None
+        try:
+            connection = self._checkout()
+            yield connection
+        finally:
+            if connection is not None:
+                self._checkin(connection)
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+            self._log_metrics()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        checkouts = stats["checkouts"]
+        return {
+            "checkouts": checkouts,
+            "timeouts": stats["timeouts"],
+            "discarded": stats["discarded"],
+            "in_use": stats["in_use"],
+            "max_size": self.max_size,
+            "utilisation": stats["in_use"] / self.max_size,
+            "wait_avg_ms": stats["wait_total"] / checkouts * 1000 if checkouts else 0,
+            "wait_max_ms": stats["wait_max"] * 1000,
+        }
+
+    def _log_metrics(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._metrics_logged_at < self.metrics_interval:
+                return
+            self._metrics_logged_at = now
+        logger.info("Player connection pool stats: %s", self.stats())
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+    def _checkout(self):
+        connection = self._pool.getconn()
+        if not self._is_healthy(connection):
+            self._discard(connection)
+            connection = self._pool.getconn()
+        return connection
+
+    def _checkin(self, connection) -> None:
+        if not connection.closed:
+            try:
+                connection.rollback()
+            except (OperationalError, InterfaceError):
+                pass
+
+        if connection.closed:
+            self._discard(connection)
+            return
+
+        with self._lock:
+            self._last_used[id(connection)] = time.monotonic()
+        self._pool.putconn(connection)
+
+    def _discard(self, connection) -> None:
+        with self._lock:
+            self._last_used.pop(id(connection), None)
+            self._stats["discarded"] += 1
+        self._pool.putconn(connection, close=True)
+
+    def _is_healthy(self, connection) -> bool:
+        if connection.closed:
+            return False
+
+        with self._lock:
+            last_used = self._last_used.get(id(connection))
+        if last_used is None:
+            return True
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+        except (OperationalError, InterfaceError):
+            logger.warning("Discarding broken investigations connection")
+            return False
+        return True
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _create_pool() -> PlayerConnectionPool:
+    database = settings.DATABASES["investigations"]
+    options = settings.SQL_PLAYER_POOL
+    user, password = options["USER"], options["PASSWORD"]
+    if not user or user == database["USER"]:
+        logger.warning(
+            "No separate player role configured (POSTGRES_PLAYER_USER): player "
+            "SQL runs as the investigations owner role %s. Create a read-only "
+            "role with SELECT on the case tables only.",
+            database["USER"],
+        )
+        user, password = database["USER"], database["PASSWORD"]
+    return PlayerConnectionPool(
+        min_size=options["MIN_SIZE"],
+        max_size=options["MAX_SIZE"],
+        timeout=options["TIMEOUT"],
+        health_check_interval=options["HEALTH_CHECK_INTERVAL"],
+        metrics_interval=options["METRICS_INTERVAL"],
+        dbname=database["NAME"],
+        host=database["HOST"],
+        port=database["PORT"],
+        user=user,
+        password=password,
+        connect_timeout=options["CONNECT_TIMEOUT"],
+        application_name="sqlhunt-player",
+        options="-c default_transaction_read_only=on",
+    )
+
+
+def get_player_pool() -> PlayerConnectionPool:
+    """
+    Return the player connection pool of the current process.
+
+    The pool is created lazily and recreated after a fork, so every Celery
+    worker process owns its own connections. Its first connections are
+    opened outside the lock, so a slow database server does not block
+    threads that already have a pool to use.
+    """
+    global _pool, _pool_pid
+
+    pool = _pool
+    if pool is not None and _pool_pid == os.getpid():
+        return pool
+
+    pool = _create_pool()
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool, _pool_pid = pool, os.getpid()
+            return pool
+        current = _pool
+    # Another thread got there first.
+    pool.close()
+    return current
+
+
+def get_player_pool_stats() -> dict | None:
+    """
+    Return the stats of the player pool, or None if this process has none.
+    """
+    pool = _pool
+    if pool is None or _pool_pid != os.getpid():
+        return None
+    return pool.stats()
@@ -0,0 +1,427 @@
+import csv
+import math
+import os
+import random
+import struct
+import time
+from datetime import date, datetime, timedelta
+
+from core.investigations.models import (
+    Alibi,
+    Article,
+    Case,
+    Charge,
+    CrimeScene,
+    Evidence,
+    Person,
+    Statement,
+    Suspect,
+    SuspectCase,
+)
+from core.services.result_cache import bump_dataset_version
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+from .utils.utils import (
+    get_alibi,
+    get_charge_status,
+    get_date_between,
+    get_date_of_birth,
+    get_descriptions,
+    get_evidence,
+    get_job,
+    get_location,
+    get_name,
+    get_random_date_between,
+    get_suspect_count,
+    get_suspect_status,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+_PG_EPOCH = date(2000, 1, 1)
+_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_TRAILER = struct.pack("!h", -1)
+_NULL = struct.pack("!i", -1)
+
+# Persons whose descriptions are drawn together while streaming.
+_PERSON_CHUNK_SIZE = 10_000
+
+
+def _encode_int4(value):
+    return struct.pack("!ii", 4, value)
+
+
+def _encode_int8(value):
+    return struct.pack("!iq", 8, value)
+
+
+def _encode_date(value):
+    return struct.pack("!ii", 4, (value - _PG_EPOCH).days)
+
+
+def _encode_text(value):
+    data = value.encode()
+    return struct.pack("!i", len(data)) + data
+
+
+_ENCODERS = {
+    "AutoField": _encode_int4,
+    "BigAutoField": _encode_int8,
+    "IntegerField": _encode_int4,
+    "BigIntegerField": _encode_int8,
+    "DateField": _encode_date,
+    "CharField": _encode_text,
+    "TextField": _encode_text,
+}
+
+
+def column_encoders(fields):
+    """
+    Return the binary COPY encoder of each model field.
+
+    Foreign keys are encoded as the primary key they point to.
+    """
+    encoders = []
+    for field in fields:
+        if field.is_relation:
+            field = field.target_field
+        encoders.append(_ENCODERS[field.get_internal_type()])
+    return encoders
+
+
+class CopyStream:
+    """
+    File-like object that encodes rows in the binary COPY format as they
+    are read, so only one buffer of rows is held in memory.
+    """
+
+    def __init__(self, rows, encoders):
+        self.rows = 0
+        self._chunks = self._encode(rows, encoders)
+        self._buffer = bytearray()
+
+    def _encode(self, rows, encoders):
+        yield _HEADER
+        field_count = struct.pack("!h", len(encoders))
+        for row in rows:
+            self.rows += 1
+            yield field_count + b"".join(
+                _NULL if value is None else encode(value)
+                for encode, value in zip(encoders, row)
+            )
+        yield _TRAILER
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+# Foreign keys and unique constraints, unique ones first so the foreign
+# keys that need them can be restored after.
+_DEFERRED_CONSTRAINTS_SQL = """
+    SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE conrelid = ANY(%s::regclass[]) AND contype IN ('u', 'f')
+    ORDER BY contype DESC, conname
+"""
+
+# Indexes that no constraint owns; primary keys stay in place.
+_DEFERRED_INDEXES_SQL = """
+    SELECT pg_get_indexdef(i.indexrelid), i.indexrelid::regclass::text
+    FROM pg_index i
+    WHERE i.indrelid = ANY(%s::regclass[])
+        AND NOT i.indisprimary
+        AND NOT EXISTS (
+            SELECT 1 FROM pg_constraint c
+            WHERE c.conindid = i.indexrelid AND c.conrelid = i.indrelid
+        )
+"""
+
+
+class CopyWriter:
+    """
+    Writes the investigations seed dataset with COPY ... FROM STDIN in the
+    binary format, without creating model instances.
+
+    Primary keys are numbered from 1 in Python right after the tables are
+    truncated, so every foreign key is known before its row is written.
+    Persons, suspects and charges, which grow with the requested size,
+    are streamed; only the rows read from the CSV files are kept in
+    memory. Foreign keys, unique constraints and secondary indexes are
+    dropped for the load and built once at the end, in the same
+    transaction.
+    """
+
+    models = (
+        Person,
+        Case,
+        Suspect,
+        SuspectCase,
+        Article,
+        Charge,
+        Alibi,
+        Statement,
+        CrimeScene,
+        Evidence,
+    )
+
+    def __init__(self, persons=1500, suspects=500, charges=100):
+        if suspects > persons:
+            raise ValueError("Подозреваемых не может быть больше, чем персон.")
+        self.persons = persons
+        self.suspects = suspects
+        self.charges = charges
+        self.connection = connections["investigations"]
+        self.timings = []
+
+    def run(self):
+        """
+        Replace the investigations data with a generated dataset.
+
+        Returns:
+            List of (stage, rows, seconds) tuples, one per table and one
+            for rebuilding indexes and constraints.
+
+        Raises:
+            ValueError: If the investigations database is not PostgreSQL.
+        """
+        if self.connection.vendor != "postgresql":
+            raise ValueError("Загрузка через COPY поддерживается только PostgreSQL.")
+
+        self.timings = []
+        tables = [model._meta.db_table for model in self.models]
+        with (
+            transaction.atomic(using="investigations"),
+            self.connection.cursor() as cursor,
+        ):
+            cursor.execute(
+                "TRUNCATE TABLE {} RESTART IDENTITY CASCADE".format(
+                    ", ".join(self.connection.ops.quote_name(t) for t in tables)
+                )
+            )
+            restore = self.drop_deferred(cursor, tables)
+
+            self.write(cursor, Person, self.person_rows())
+            cases = self.read_cases()
+            self.write(cursor, Case, cases)
+            self.write(cursor, Suspect, self.suspect_rows())
+            links = self.case_suspect_links(cases)
+            self.write(cursor, SuspectCase, links)
+            articles = self.read_articles()
+            self.write(cursor, Article, articles)
+            self.write(cursor, Charge, self.charge_rows(articles))
+            self.write(cursor, Alibi, self.alibi_rows(links))
+            self.write(cursor, Statement, self.statement_rows(cases))
+            scenes = self.crime_scene_rows(cases)
+            self.write(cursor, CrimeScene, scenes)
+            self.write(cursor, Evidence, self.evidence_rows(cases, scenes))
+
+            start = time.perf_counter()
+            for sql in restore:
+                cursor.execute(sql)
+            for sql in self.connection.ops.sequence_reset_sql(no_style(), self.models):
+                cursor.execute(sql)
+            self.timings.append(("indexes", len(restore), time.perf_counter() - start))
+            transaction.on_commit(bump_dataset_version, using="investigations")
+
+        return self.timings
+
+    def drop_deferred(self, cursor, tables):
+        """
+        Drop foreign keys, unique constraints and secondary indexes.
+
+        Returns:
+            SQL statements that create them again.
+        """
+        quote = self.connection.ops.quote_name
+        cursor.execute(_DEFERRED_CONSTRAINTS_SQL, [tables])
+        constraints = cursor.fetchall()
+        cursor.execute(_DEFERRED_INDEXES_SQL, [tables])
+        indexes = cursor.fetchall()
+
+        for table, name, _ in reversed(constraints):
+            cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {quote(name)}")
+        for _, name in indexes:
+            cursor.execute(f"DROP INDEX {name}")
+
+        return [definition for definition, _ in indexes] + [
+            f"ALTER TABLE {table} ADD CONSTRAINT {quote(name)} {definition}"
+            for table, name, definition in constraints
+        ]
+
+    def write(self, cursor, model, rows):
+        fields = model._meta.concrete_fields
+        stream = CopyStream(rows, column_encoders(fields))
+        sql = "COPY {} ({}) FROM STDIN (FORMAT binary)".format(
+            self.connection.ops.quote_name(model._meta.db_table),
+            ", ".join(self.connection.ops.quote_name(f.column) for f in fields),
+        )
+
+        start = time.perf_counter()
+        cursor.copy_expert(sql, stream)
+        self.timings.append(
+            (model._meta.db_table, stream.rows, time.perf_counter() - start)
+        )
+
+    # Rows are tuples in the order of the model's concrete fields.
+
+    def person_rows(self):
+        for first_id in range(1, self.persons + 1, _PERSON_CHUNK_SIZE):
+            ids = range(first_id, min(first_id + _PERSON_CHUNK_SIZE, self.persons + 1))
+            names = [get_name() for _ in ids]
+            descriptions = get_descriptions(names, [get_job() for _ in ids])
+            for person_id, name, description in zip(ids, names, descriptions):
+                yield person_id, name, get_date_of_birth(), description
+
+    def suspect_rows(self):
+        # i -> (step * i + offset) mod persons with gcd(step, persons) == 1
+        # is a permutation, so suspects get distinct, scattered persons
+        # without a sample of all person ids in memory.
+        step = random.randrange(1, self.persons) if self.persons > 1 else 1
+        while math.gcd(step, self.persons) != 1:
+            step = random.randrange(1, self.persons)
+        offset = random.randrange(self.persons) if self.persons else 0
+        for suspect_id in range(1, self.suspects + 1):
+            person_id = (step * suspect_id + offset) % self.persons + 1
+            yield suspect_id, person_id, get_suspect_status()
+
+    def read_cases(self):
+        cases = []
+        with open(
+            os.path.join(DATA_DIR, "case.csv"), newline="", encoding="utf-8"
+        ) as f:
+            for case_id, row in enumerate(csv.DictReader(f), start=1):
+                date_opened = datetime.strptime(row["date_opened"], "%Y-%m-%d").date()
+                date_closed = (
+                    datetime.strptime(row["date_closed"], "%Y-%m-%d").date()
+                    if row["date_closed"]
+                    else None
+                )
+                cases.append(
+                    (
+                        case_id,
+                        row["description"],
+                        date_opened,
+                        date_closed,
+                        row["type"],
+                        row["status"],
+                        row["resolution"],
+                    )
+                )
+        return cases
+
+    def case_suspect_links(self, cases):
+        # Charges are generated after the links, as in
+        # InvestigationsDataGenerator.run, so suspects are drawn uniformly.
+        links = []
+        suspect_ids = range(1, self.suspects + 1)
+        for case in cases:
+            count = min(get_suspect_count(), self.suspects)
+            for suspect_id in random.sample(suspect_ids, count):
+                links.append((len(links) + 1, case[0], suspect_id))
+        return links
+
+    def read_articles(self):
+        with open(
+            os.path.join(DATA_DIR, "article.csv"), newline="", encoding="utf-8"
+        ) as f:
+            return [(int(row["id"]), row["description"]) for row in csv.DictReader(f)]
+
+    def charge_rows(self, articles):
+        if not self.suspects:
+            return
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=25 * 365)
+        date_range = (end_date - start_date).days
+
+        for charge_id in range(1, self.charges + 1):
+            article_id = random.choice(articles)[0]
+            suspect_id = random.randint(1, self.suspects)
+            date_accusation = start_date + timedelta(days=random.randint(0, date_range))
+            yield (
+                charge_id,
+                article_id,
+                suspect_id,
+                date_accusation.date(),
+                get_charge_status(),
+            )
+
+    def alibi_rows(self, links):
+        used_suspects = set()
+        for _, case_id, suspect_id in links:
+            if suspect_id in used_suspects:
+                continue
+            used_suspects.add(suspect_id)
+            status, description = get_alibi()
+            yield len(used_suspects), status, case_id, description, suspect_id
+
+    def statement_rows(self, cases):
+        opened = {case[0]: case[2] for case in cases}
+        statement_id = 0
+        with open(
+            os.path.join(DATA_DIR, "statement.csv"), newline="", encoding="utf-8"
+        ) as f:
+            for row in csv.DictReader(f):
+                case_id = int(row["case_id"])
+                person_id = int(row["person_id"])
+                if case_id not in opened or not 1 <= person_id <= self.persons:
+                    continue
+
+                date_of_statement = datetime.strptime(
+                    row["date_of_statement"], "%Y-%m-%d"
+                ).date()
+                if date_of_statement < opened[case_id]:
+                    date_of_statement = opened[case_id] + timedelta(
+                        days=random.randint(1, 30)
+                    )
+                statement_id += 1
+                yield (
+                    statement_id,
+                    case_id,
+                    person_id,
+                    row["statement"],
+                    date_of_statement,
+                )
+
+    def crime_scene_rows(self, cases):
+        scenes = []
+        used_locations = set()
+        for case_id, _, date_opened, *_ in cases:
+            latest_date = date_opened - timedelta(days=1)
+            crime_date = get_date_between(latest_date - timedelta(days=30), latest_date)
+            location = get_location()
+            while location in used_locations:
+                location = get_location()
+            used_locations.add(location)
+            scenes.append((len(scenes) + 1, location, crime_date, case_id))
+        return scenes
+
+    def evidence_rows(self, cases, scenes):
+        cases_by_id = {case[0]: case for case in cases}
+        evidence_id = 0
+        for scene_id, _, _, case_id in scenes:
+            _, _, date_opened, date_closed, crime_type, _, _ = cases_by_id[case_id]
+            date_closed = date_closed or datetime.now().date()
+
+            for _ in range(random.randint(1, 5)):
+                picked = get_evidence(crime_type)
+                if picked is None:
+                    continue
+                evidence_type, description = picked
+                evidence_id += 1
+                yield (
+                    evidence_id,
+                    evidence_type,
+                    description,
+                    get_random_date_between(date_opened, date_closed),
+                    scene_id,
+                )
@@ -894,3 +894,51 @@ PRONOUNS = {
         "colleague": "коллега",
     },
 }
+
+
+# Lookup tables compiled once at import, so the generator resolves an item
+# color or the evidence of a crime type by indexing instead of scanning.
+
+
+def find_colors(gender, clothing_item):
+    """
+    Return the colors of a clothing item: those of its last word, else of
+    the first COLORS key it contains or is contained in, else None.
+    """
+    base_item = clothing_item.split()[-1]
+    if base_item in COLORS[gender]:
+        return COLORS[gender][base_item]
+
+    for key in COLORS[gender]:
+        if key in clothing_item or clothing_item in key:
+            return COLORS[gender][key]
+    return None
+
+
+# gender -> clothing item -> colors (None if the item has none)
+ITEM_COLORS = {
+    gender: {
+        item: find_colors(gender, item)
+        for part in CLOTHES.values()
+        for item in part[gender]
+    }
+    for gender in COLORS
+}
+
+
+def _evidence_by_crime_type():
+    compiled = {}
+    for evidence_type, descriptions_by_crime in EVIDENCE_CATALOG.items():
+        for crime_type, descriptions in descriptions_by_crime.items():
+            compiled.setdefault(crime_type, {})[evidence_type] = descriptions
+    return compiled
+
+
+# crime type -> evidence type -> descriptions, in EVIDENCE_CATALOG order
+EVIDENCE_BY_CRIME_TYPE = _evidence_by_crime_type()
+
+# crime type -> evidence types, ready for random.choice
+EVIDENCE_TYPES_BY_CRIME_TYPE = {
+    crime_type: list(descriptions)
+    for crime_type, descriptions in EVIDENCE_BY_CRIME_TYPE.items()
+}
@@ -1,6 +1,7 @@
 import csv
 import os
 import random
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 from core.investigations.models import (
@@ -13,32 +14,43 @@ from core.investigations.models import (
     Person,
     Statement,
     Suspect,
+    SuspectCase,
 )
-from django.db import connections
+from core.services.result_cache import bump_dataset_version
+from django.db import connections, transaction
 
 from .utils.utils import (
+    get_alibi,
     get_articles,
-    get_available_evidence_types,
     get_charge_status,
-    get_confirmed_alibi,
     get_date_between,
     get_date_of_birth,
-    get_description,
-    get_false_alibi,
+    get_descriptions,
+    get_evidence,
     get_job,
     get_location,
     get_name,
     get_random_date_between,
-    get_random_evidence_description,
     get_sample_suspects,
     get_suspect_count,
     get_suspect_status,
-    get_unconfirmed_alibi,
 )
 
+DEFAULT_BATCH_SIZE = 1000
+
 
 class InvestigationsDataGenerator:
-    def __init__(self):
+    """
+    Fills the investigations database with generated data.
+
+    Every generate_* stage builds its rows in memory and writes them with
+    bulk_create in batches of ``batch_size`` rows, inside one transaction
+    per stage. Created rows are indexed by model and id in ``by_id``, so
+    later stages look them up in constant time.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
         self.persons = []
         self.cases = []
         self.suspects = []
@@ -49,27 +61,35 @@ class InvestigationsDataGenerator:
         self.scenes = []
         self.evidence = []
         self.case_suspects = []
-        
+        self.by_id = defaultdict(dict)
+
     def has_data(self):
         return Case.objects.exists()
-    
-    def generate_persons(self, count: int = 1500):
-        for _ in range(count):
-            name = get_name()
-            date_of_birth = get_date_of_birth()
-            job = get_job()
-            description = get_description(name, job)
 
-            person = Person.objects.using("investigations").create(
-                name=name, date_birth=date_of_birth, description=description
-            )
-            self.persons.append(person)
+    def bulk_create(self, model, objects):
+        created = model.objects.using("investigations").bulk_create(
+            objects, batch_size=self.batch_size
+        )
+        self.by_id[model].update((obj.pk, obj) for obj in created)
+        return created
 
+    @transaction.atomic(using="investigations")
+    def generate_persons(self, count: int = 1500):
+        names = [get_name() for _ in range(count)]
+        jobs = [get_job() for _ in range(count)]
+        persons = [
+            Person(name=name, date_birth=get_date_of_birth(), description=description)
+            for name, description in zip(names, get_descriptions(names, jobs))
+        ]
+        self.persons.extend(self.bulk_create(Person, persons))
+
+    @transaction.atomic(using="investigations")
     def generate_cases(self, csv_path=None):
         if csv_path is None:
             base_dir = os.path.dirname(os.path.abspath(__file__))
             csv_path = os.path.join(base_dir, "data", "case.csv")
 
+        cases = []
         with open(csv_path, newline="", encoding="utf-8") as csvfile:
             reader = csv.DictReader(csvfile)
             for row in reader:
@@ -79,24 +99,28 @@ class InvestigationsDataGenerator:
                     if row["date_closed"]
                     else None
                 )
-                case = Case.objects.using("investigations").create(
-                    description=row["description"],
-                    date_opened=date_opened,
-                    date_closed=date_closed,
-                    type=row["type"],
-                    resolution=row["resolution"],
-                    status=row["status"],
+                cases.append(
+                    Case(
+                        description=row["description"],
+                        date_opened=date_opened,
+                        date_closed=date_closed,
+                        type=row["type"],
+                        resolution=row["resolution"],
+                        status=row["status"],
+                    )
                 )
-                self.cases.append(case)
+        self.cases.extend(self.bulk_create(Case, cases))
 
+    @transaction.atomic(using="investigations")
     def generate_suspects(self, count: int = 500):
         persons_sample = random.sample(self.persons, min(count, len(self.persons)))
-        for person in persons_sample:
-            suspect = Suspect.objects.using("investigations").create(
-                person=person, status=get_suspect_status()
-            )
-            self.suspects.append(suspect)
+        suspects = [
+            Suspect(person=person, status=get_suspect_status())
+            for person in persons_sample
+        ]
+        self.suspects.extend(self.bulk_create(Suspect, suspects))
 
+    @transaction.atomic(using="investigations")
     def generate_articles(self, csv_path=None):
         if csv_path is None:
             base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -104,12 +128,12 @@ class InvestigationsDataGenerator:
 
         with open(csv_path, newline="", encoding="utf-8") as csvfile:
             reader = csv.DictReader(csvfile)
-            for row in reader:
-                article = Article.objects.using("investigations").create(
-                    id=row["id"], description=row["description"]
-                )
-                self.articles.append(article)
+            articles = [
+                Article(id=row["id"], description=row["description"]) for row in reader
+            ]
+        self.articles.extend(self.bulk_create(Article, articles))
 
+    @transaction.atomic(using="investigations")
     def generate_charges(self, count: int = 100):
         if not self.articles or not self.suspects:
             raise ValueError("Сначала нужно сгенерировать articles и suspects")
@@ -118,6 +142,7 @@ class InvestigationsDataGenerator:
         start_date = end_date - timedelta(days=25 * 365)
         date_range = (end_date - start_date).days
 
+        charges = []
         for _ in range(count):
             article = random.choice(self.articles)
             suspect = random.choice(self.suspects)
@@ -125,43 +150,41 @@ class InvestigationsDataGenerator:
             date_accusation = start_date + timedelta(days=random_days)
 
             status = get_charge_status()
-            charge = Charge.objects.using("investigations").create(
-                article=article,
-                suspect=suspect,
-                date_accusation=date_accusation.date(),
-                status=status,
+            charges.append(
+                Charge(
+                    article=article,
+                    suspect=suspect,
+                    date_accusation=date_accusation.date(),
+                    status=status,
+                )
             )
-            self.charges.append(charge)
+        self.charges.extend(self.bulk_create(Charge, charges))
 
+    @transaction.atomic(using="investigations")
     def generate_alibis(self):
         used_suspects = set()
+        alibis = []
+        cases = self.by_id[Case]
+        suspects = self.by_id[Suspect]
 
         for case_id, suspect_id in self.case_suspects:
             if suspect_id in used_suspects:
                 continue
             used_suspects.add(suspect_id)
 
-            case = next(c for c in self.cases if c.id == case_id)
-            suspect = next(s for s in self.suspects if s.id == suspect_id)
-
-            if random.random() < 0.3:
-                status = "ложное"
-                description = get_false_alibi()
-            else:
-                status = random.choices(
-                    ["подтверждено", "не подтверждено"], weights=[0.6, 0.4]
-                )[0]
-                description = (
-                    get_confirmed_alibi()
-                    if status == "подтверждено"
-                    else get_unconfirmed_alibi()
-                )
+            case = cases[case_id]
+            suspect = suspects[suspect_id]
+
+            status, description = get_alibi()
 
-            alibi = Alibi.objects.using("investigations").create(
-                status=status, case=case, description=description, suspect=suspect
+            alibis.append(
+                Alibi(
+                    status=status, case=case, description=description, suspect=suspect
+                )
             )
-            self.alibis.append(alibi)
+        self.alibis.extend(self.bulk_create(Alibi, alibis))
 
+    @transaction.atomic(using="investigations")
     def generate_statements(self, csv_path=None):
         if not self.cases or not self.persons:
             raise ValueError("Сначала нужно сгенерировать cases и persons")
@@ -170,14 +193,18 @@ class InvestigationsDataGenerator:
             base_dir = os.path.dirname(os.path.abspath(__file__))
             csv_path = os.path.join(base_dir, "data", "statement.csv")
 
+        statements = []
+        cases = self.by_id[Case]
+        persons = self.by_id[Person]
         with open(csv_path, newline="", encoding="utf-8") as csvfile:
             reader = csv.DictReader(csvfile)
             for row in reader:
                 try:
-                    case = next(c for c in self.cases if c.id == int(row["case_id"]))
-                    person = next(
-                        p for p in self.persons if p.id == int(row["person_id"])
-                    )
+                    case = cases.get(int(row["case_id"]))
+                    person = persons.get(int(row["person_id"]))
+                    if case is None or person is None:
+                        print(f"Не найдено case или person для statement: {row}")
+                        continue
 
                     date_of_statement = datetime.strptime(
                         row["date_of_statement"], "%Y-%m-%d"
@@ -187,21 +214,21 @@ class InvestigationsDataGenerator:
                             days=random.randint(1, 30)
                         )
 
-                    statement = Statement.objects.using("investigations").create(
-                        case=case,
-                        person=person,
-                        statement=row["statement"],
-                        date_of_statement=date_of_statement,
+                    statements.append(
+                        Statement(
+                            case=case,
+                            person=person,
+                            statement=row["statement"],
+                            date_of_statement=date_of_statement,
+                        )
                     )
-                    self.statements.append(statement)
 
-                except StopIteration:
-                    print(f"Не найдено case или person для statement: {row}")
-                    continue
                 except Exception as e:
                     print(f"Ошибка при создании statement: {e}")
                     continue
+        self.statements.extend(self.bulk_create(Statement, statements))
 
+    @transaction.atomic(using="investigations")
     def generate_crime_scenes(self):
         used_locations = set()
 
@@ -212,18 +239,19 @@ class InvestigationsDataGenerator:
                     used_locations.add(location)
                     return location
 
+        scenes = []
         for case in self.cases:
             latest_date = case.date_opened - timedelta(days=1)
             earliest_date = latest_date - timedelta(days=30)
             crime_date = get_date_between(earliest_date, latest_date)
             location = get_unique_location()
 
-            scene = CrimeScene.objects.using("investigations").create(
-                location=location, date=crime_date, case=case
-            )
-            self.scenes.append(scene)
+            scenes.append(CrimeScene(location=location, date=crime_date, case=case))
+        self.scenes.extend(self.bulk_create(CrimeScene, scenes))
 
+    @transaction.atomic(using="investigations")
     def generate_evidence(self):
+        evidence = []
         for scene in self.scenes:
             case = scene.case
             crime_type = case.type
@@ -233,25 +261,24 @@ class InvestigationsDataGenerator:
             num_evidences = random.randint(1, 5)
 
             for _ in range(num_evidences):
-                available_types = get_available_evidence_types(crime_type)
-                if not available_types:
-                    continue
-
-                evidence_type = random.choice(available_types)
-                description = get_random_evidence_description(evidence_type, crime_type)
-                if not description:
+                picked = get_evidence(crime_type)
+                if picked is None:
                     continue
+                evidence_type, description = picked
 
                 evidence_date = get_random_date_between(date_opened, date_closed)
 
-                evidence = Evidence.objects.using("investigations").create(
-                    type=evidence_type,
-                    description=description,
-                    date=evidence_date,
-                    scene=scene,
+                evidence.append(
+                    Evidence(
+                        type=evidence_type,
+                        description=description,
+                        date=evidence_date,
+                        scene=scene,
+                    )
                 )
-                self.evidence.append(evidence)
+        self.evidence.extend(self.bulk_create(Evidence, evidence))
 
+    @transaction.atomic(using="investigations")
     def generate_case_suspect(self):
         suspect_to_articles = {}
         for charge in self.charges:
@@ -270,6 +297,7 @@ class InvestigationsDataGenerator:
 
         all_suspect_ids = [s.id for s in self.suspects]
 
+        links = []
         for case in self.cases:
             case_id = case.id
             case_type = case.type
@@ -288,15 +316,18 @@ class InvestigationsDataGenerator:
                 chosen_suspects.add(matched)
 
             if len(chosen_suspects) < num_suspects:
-                remaining = list(set(all_suspect_ids) - chosen_suspects)
                 chosen_suspects.update(
-                    get_sample_suspects(num_suspects - len(chosen_suspects), remaining)
+                    get_sample_suspects(
+                        num_suspects - len(chosen_suspects),
+                        all_suspect_ids,
+                        exclude=chosen_suspects,
+                    )
                 )
 
             for sid in chosen_suspects:
-                suspect = next(s for s in self.suspects if s.id == sid)
-                suspect.cases.add(case)
+                links.append(SuspectCase(case_id=case_id, suspect_id=sid))
                 self.case_suspects.append((case_id, sid))
+        self.bulk_create(SuspectCase, links)
 
     def clear_all_data(self):
         tables = [
@@ -328,3 +359,6 @@ class InvestigationsDataGenerator:
         self.generate_statements()
         self.generate_crime_scenes()
         self.generate_evidence()
+        # Deferred so data that is rolled back, as in benchmarks, leaves
+        # the result cache alone.
+        transaction.on_commit(bump_dataset_version, using="investigations")
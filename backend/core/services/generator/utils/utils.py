@@ -6,17 +6,19 @@ from core.services.generator.data.tables import (
     BUILD,
     CHARGE_STATUSES,
     CLOTHES,
-    COLORS,
     CONFIRMED_ALIBI,
     CRIME_TYPE_TO_ARTICLES,
     DETAILS,
-    EVIDENCE_CATALOG,
+    EVIDENCE_BY_CRIME_TYPE,
+    EVIDENCE_TYPES_BY_CRIME_TYPE,
     FALSE_ALIBI,
     HAIR_COLORS,
     HAIR_STYLES,
+    ITEM_COLORS,
     SUSPECT_STATUSES,
     TRAITS,
     UNCONFIRMED_ALIBI,
+    find_colors,
 )
 from faker import Faker
 
@@ -49,15 +51,16 @@ def get_gender(full_name):
     return "жен"
 
 
-def get_color(gender, clothing_item):
-    base_item = clothing_item.split()[-1]
+def get_color_options(gender, clothing_item):
+    try:
+        return ITEM_COLORS[gender][clothing_item]
+    except KeyError:
+        return find_colors(gender, clothing_item)
 
-    if base_item in COLORS[gender]:
-        return random.choice(COLORS[gender][base_item])
 
-    for key in COLORS[gender]:
-        if key in clothing_item or clothing_item in key:
-            return random.choice(COLORS[gender][key])
+def get_color(gender, clothing_item):
+    options = get_color_options(gender, clothing_item)
+    return random.choice(options) if options else None
 
 
 def get_build(gender):
@@ -115,6 +118,74 @@ def get_description(name, job):
     hair_color = get_hair_color()
     appearance = generate_appearance(gender)
 
+    return format_description(
+        gender, height, build, hair_style, hair_color, appearance, job
+    )
+
+
+def get_descriptions(names, jobs):
+    """
+    Return get_description(name, job) for every pair of names and jobs.
+
+    Attributes are drawn for all persons of a gender at once, with one
+    random.choices call per catalog instead of a random.choice call per
+    person and attribute. Every description follows the same distribution
+    as one drawn by get_description.
+    """
+    genders = [get_gender(name) for name in names]
+    indices_by_gender = {}
+    for index, gender in enumerate(genders):
+        indices_by_gender.setdefault(gender, []).append(index)
+
+    descriptions = [None] * len(genders)
+    for gender, indices in indices_by_gender.items():
+        k = len(indices)
+        heights = random.choices(
+            range(170, 201) if gender == "муж" else range(150, 186), k=k
+        )
+        builds = random.choices(BUILD[gender], k=k)
+        hair_styles = random.choices(HAIR_STYLES[gender], k=k)
+        hair_colors = random.choices(HAIR_COLORS, k=k)
+        clothes = [
+            _choices_with_color(gender, CLOTHES[part][gender], k)
+            for part in ("верх", "низ", "обувь")
+        ]
+        accessories = random.choices(ACCESSORIES[gender], k=k)
+        trait_counts = random.choices((1, 2, 3), k=k)
+        # Drawn for everyone and kept for the ~15% that have details.
+        details = random.choices(DETAILS, k=k)
+
+        for i, index in enumerate(indices):
+            appearance = {
+                "top": clothes[0][i],
+                "bottom": clothes[1][i],
+                "shoes": clothes[2][i],
+                "accessory": accessories[i],
+                "traits": random.sample(TRAITS, k=trait_counts[i]),
+                "details": [details[i]] if random.random() > 0.85 else [],
+            }
+            descriptions[index] = format_description(
+                gender,
+                heights[i],
+                builds[i],
+                hair_styles[i],
+                hair_colors[i],
+                appearance,
+                jobs[index],
+            )
+    return descriptions
+
+
+def _choices_with_color(gender, items, k):
+    colored = []
+    for item in random.choices(items, k=k):
+        options = get_color_options(gender, item)
+        color = random.choice(options) if options else ""
+        colored.append(f"{color} {item}")
+    return colored
+
+
+def format_description(gender, height, build, hair_style, hair_color, appearance, job):
     description = (
         f"{build.capitalize()} {'мужчина' if gender == 'муж' else 'женщина'} {height} см. "
         + (
@@ -144,16 +215,29 @@ def get_random_date_between(start_date, end_date):
 
 
 def get_available_evidence_types(crime_type):
-    return [
-        etype for etype in EVIDENCE_CATALOG if crime_type in EVIDENCE_CATALOG[etype]
-    ]
+    return EVIDENCE_TYPES_BY_CRIME_TYPE.get(crime_type, [])
 
 
 def get_random_evidence_description(evidence_type, crime_type):
-    options = EVIDENCE_CATALOG.get(evidence_type, {}).get(crime_type, [])
+    options = EVIDENCE_BY_CRIME_TYPE.get(crime_type, {}).get(evidence_type, [])
     return random.choice(options) if options else None
 
 
+def get_evidence(crime_type):
+    """
+    Return the type and description of a random evidence for a crime type,
+    or None if the catalog has nothing to offer.
+    """
+    available_types = get_available_evidence_types(crime_type)
+    if not available_types:
+        return None
+    evidence_type = random.choice(available_types)
+    description = get_random_evidence_description(evidence_type, crime_type)
+    if not description:
+        return None
+    return evidence_type, description
+
+
 def get_false_alibi():
     return random.choice(FALSE_ALIBI)
 
@@ -166,8 +250,23 @@ def get_unconfirmed_alibi():
     return random.choice(UNCONFIRMED_ALIBI)
 
 
-def get_sample_suspects(n, available_ids):
-    return random.sample(available_ids, min(n, len(available_ids)))
+def get_alibi():
+    """
+    Return the status and description of a random alibi.
+    """
+    if random.random() < 0.3:
+        return "ложное", get_false_alibi()
+    status = random.choices(["подтверждено", "не подтверждено"], weights=[0.6, 0.4])[0]
+    if status == "подтверждено":
+        return status, get_confirmed_alibi()
+    return status, get_unconfirmed_alibi()
+
+
+def get_sample_suspects(n, available_ids, exclude=()):
+    # Oversample by len(exclude) and drop the excluded ids: the result is
+    # a uniform sample of the remaining ids without copying them.
+    sample = random.sample(available_ids, min(n + len(exclude), len(available_ids)))
+    return [sid for sid in sample if sid not in exclude][:n]
 
 
 def get_suspect_count():
@@ -0,0 +1,183 @@
+import logging
+import threading
+from functools import wraps
+
+import redis
+from core.users.models import User
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_KEY = "leaderboard:xp"
+# Users updated since the last rebuild started.
+CHANGED_KEY = f"{LEADERBOARD_KEY}:changed"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> redis.Redis | None:
+    """
+    Return the Redis client of the leaderboard, or None if it is disabled.
+    """
+    global _client
+
+    if not settings.LEADERBOARD_REDIS_URL:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = redis.Redis.from_url(
+                settings.LEADERBOARD_REDIS_URL, socket_timeout=1
+            )
+        return _client
+
+
+def _incremental_update(func):
+    # Updates run after commit and must never fail the request; a missed
+    # update is repaired by the rebuild_leaderboard command.
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        client = get_client()
+        if client is None:
+            return
+        try:
+            func(client, *args, **kwargs)
+        except redis.RedisError:
+            logger.warning("Leaderboard update %s failed", func.__name__)
+
+    return wrapper
+
+
+@_incremental_update
+def sync_xp(client, user_ids: list[int]) -> None:
+    """
+    Copy the current XP of the given users from users_user.
+
+    XP is read when the update runs, after the commit that changed it, and
+    stored as an absolute score, so a repeated, lost or reordered update
+    is corrected by the next one. Users that no longer exist are removed.
+    """
+    if not user_ids:
+        return
+    # Marked before the read, so a rebuild that swaps in its set after
+    # this point re-reads these users, see rebuild().
+    client.sadd(CHANGED_KEY, *user_ids)
+    _write_scores(client, user_ids)
+
+
+def _write_scores(client, user_ids) -> None:
+    user_xp = dict(User.objects.filter(id__in=user_ids).values_list("id", "xp"))
+    deleted = [user_id for user_id in user_ids if user_id not in user_xp]
+    pipeline = client.pipeline(transaction=False)
+    if user_xp:
+        pipeline.zadd(LEADERBOARD_KEY, user_xp)
+    if deleted:
+        pipeline.zrem(LEADERBOARD_KEY, *deleted)
+    pipeline.execute()
+
+
+def _entries(members, start_rank: int) -> list[dict]:
+    usernames = dict(
+        User.objects.filter(
+            id__in=[int(user_id) for user_id, _ in members]
+        ).values_list("id", "username")
+    )
+    return [
+        {
+            "rank": start_rank + offset,
+            "user_id": int(user_id),
+            "username": usernames.get(int(user_id), ""),
+            "xp": int(xp),
+        }
+        for offset, (user_id, xp) in enumerate(members)
+    ]
+
+
+def get_top(limit: int) -> list[dict]:
+    """
+    Return the ``limit`` users with the most XP, ranked from 1.
+    """
+    client = get_client()
+    if client is None:
+        return []
+    members = client.zrevrange(LEADERBOARD_KEY, 0, limit - 1, withscores=True)
+    return _entries(members, 1)
+
+
+def get_user_standing(user_id: int, neighbours: int) -> dict | None:
+    """
+    Return the rank of a user and up to ``neighbours`` users on each side.
+
+    Returns:
+        Dict with ``rank``, ``xp`` and ``neighbours``, or None if the user
+        is not on the leaderboard.
+    """
+    client = get_client()
+    if client is None:
+        return None
+    pipeline = client.pipeline(transaction=False)
+    pipeline.zrevrank(LEADERBOARD_KEY, user_id)
+    pipeline.zscore(LEADERBOARD_KEY, user_id)
+    rank, xp = pipeline.execute()
+    if rank is None:
+        return None
+
+    start = max(rank - neighbours, 0)
+    members = client.zrevrange(
+        LEADERBOARD_KEY, start, rank + neighbours, withscores=True
+    )
+    return {
+        "rank": rank + 1,
+        "xp": int(xp),
+        "neighbours": _entries(members, start + 1),
+    }
+
+
+def rebuild(batch_size: int = 10_000) -> int:
+    """
+    Rebuild the leaderboard from users_user.
+
+    The new set is filled under a temporary key and swapped in with
+    RENAME, so readers never see a partial leaderboard. Updates that land
+    while it is filled go to the old set and would be lost with it, so
+    every user that sync_xp touched since the rebuild started is re-read
+    from the database and written again after the swap.
+
+    Returns:
+        Number of users on the leaderboard.
+
+    Raises:
+        ValueError: If the leaderboard is disabled.
+    """
+    client = get_client()
+    if client is None:
+        raise ValueError("Рейтинг отключён: не задан LEADERBOARD_REDIS_URL.")
+    tmp_key = f"{LEADERBOARD_KEY}:rebuild"
+    client.delete(tmp_key, CHANGED_KEY)
+
+    count = 0
+    batch = {}
+    for user_id, xp in User.objects.values_list("id", "xp").iterator(
+        chunk_size=batch_size
+    ):
+        batch[user_id] = xp
+        if len(batch) >= batch_size:
+            client.zadd(tmp_key, batch)
+            count += len(batch)
+            batch = {}
+    if batch:
+        client.zadd(tmp_key, batch)
+        count += len(batch)
+
+    pipeline = client.pipeline()
+    if count:
+        pipeline.rename(tmp_key, LEADERBOARD_KEY)
+    else:
+        pipeline.delete(LEADERBOARD_KEY)
+    pipeline.smembers(CHANGED_KEY)
+    pipeline.delete(CHANGED_KEY)
+    changed = [int(user_id) for user_id in pipeline.execute()[1]]
+
+    for start in range(0, len(changed), batch_size):
+        _write_scores(client, changed[start : start + batch_size])
+    return count
@@ -0,0 +1,161 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from core.users.models import AvailableTable, Case
+from django.conf import settings
+from django.core.cache import cache
+
+ALLOWED_TABLES_KEY = "sql:allowed_tables:{case_id}"
+QUERY_LIMITS_KEY = "sql:query_limits:{case_id}"
+VALIDATION_KEY = "sql:validated:{digest}"
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded in-process LRU cache with hit/miss counters.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+validation_cache = LRUCache(settings.SQL_VALIDATION_CACHE_SIZE)
+
+
+def normalize_sql(raw_sql: str) -> str:
+    """
+    Normalize query text for use in cache keys.
+
+    Whitespace is only collapsed when the query has no quoted literals,
+    quoted identifiers or comments, so two keys never map to queries with
+    different meaning.
+    """
+    sql = raw_sql.strip().rstrip(";").strip()
+    if not any(token in sql for token in ("'", '"', "$", "--", "/*")):
+        sql = " ".join(sql.split())
+    return sql
+
+
+def tables_fingerprint(allowed_tables) -> str:
+    return hashlib.sha1(
+        ",".join(sorted(allowed_tables)).encode(), usedforsecurity=False
+    ).hexdigest()
+
+
+def get_allowed_tables(case_id: int) -> frozenset[str]:
+    key = ALLOWED_TABLES_KEY.format(case_id=case_id)
+    allowed_tables = cache.get(key)
+    if allowed_tables is None:
+        allowed_tables = frozenset(
+            AvailableTable.objects.filter(case_id=case_id).values_list(
+                "table", flat=True
+            )
+        )
+        cache.set(key, allowed_tables, timeout=None)
+    return allowed_tables
+
+
+def invalidate_allowed_tables(case_id: int) -> None:
+    cache.delete(ALLOWED_TABLES_KEY.format(case_id=case_id))
+
+
+def get_query_limits(case_id: int) -> dict:
+    """
+    Return the resource limits for player queries in a case.
+
+    Values set on the case override the SQL_QUERY_LIMITS defaults.
+    """
+    key = QUERY_LIMITS_KEY.format(case_id=case_id)
+    limits = cache.get(key)
+    if limits is None:
+        defaults = settings.SQL_QUERY_LIMITS
+        overrides = Case.objects.filter(pk=case_id).values(*defaults).first() or {}
+        limits = {
+            name: default if overrides.get(name) is None else overrides[name]
+            for name, default in defaults.items()
+        }
+        cache.set(key, limits, timeout=None)
+    return limits
+
+
+def invalidate_query_limits(case_id: int) -> None:
+    cache.delete(QUERY_LIMITS_KEY.format(case_id=case_id))
+
+
+def get_or_validate(raw_sql: str, allowed_tables, validate) -> str:
+    """
+    Return the prepared SQL for a query, reusing earlier validation results.
+
+    Results are keyed by the normalized query text and a fingerprint of the
+    allowed table set, so a changed table set never reuses a stale entry.
+    Rejections are cached as well and re-raised as ValueError.
+    """
+    sql = normalize_sql(raw_sql)
+    key = (sql, tables_fingerprint(allowed_tables))
+
+    entry = validation_cache.get(key)
+    if entry is None and settings.SQL_VALIDATION_CACHE_SHARED:
+        digest = hashlib.sha1("\0".join(key).encode(), usedforsecurity=False)
+        shared_key = VALIDATION_KEY.format(digest=digest.hexdigest())
+        entry = cache.get(shared_key)
+        if entry is None:
+            entry = _validate(sql, allowed_tables, validate)
+            cache.set(shared_key, entry, settings.SQL_VALIDATION_CACHE_TIMEOUT)
+        validation_cache.set(key, entry)
+    elif entry is None:
+        entry = _validate(sql, allowed_tables, validate)
+        validation_cache.set(key, entry)
+
+    is_valid, value = entry
+    if not is_valid:
+        raise ValueError(value)
+    return value
+
+
+def _validate(sql: str, allowed_tables, validate) -> tuple[bool, str]:
+    try:
+        return True, validate(sql, set(allowed_tables))
+    except ValueError as e:
+        return False, str(e)
@@ -0,0 +1,38 @@
+import time
+
+from django.core.cache import cache
+
+RESOURCE_VERSION_KEY = "http:version:{resource}"
+
+CASES = "cases"
+
+
+def user_progress(user_id: int) -> str:
+    return f"progress:{user_id}"
+
+
+def get_resource_versions(*resources: str) -> list[int]:
+    """
+    Return the current version of each resource in one cache round trip.
+
+    A version is the time of the last change in nanoseconds, so it doubles
+    as the Last-Modified date and never repeats after the cache is flushed.
+    Resources without a version start at the current time.
+    """
+    keys = [RESOURCE_VERSION_KEY.format(resource=resource) for resource in resources]
+    versions = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        versions.update(cache.get_many(missing))
+
+    return [versions.get(key, 0) for key in keys]
+
+
+def bump_resource_version(resource: str) -> None:
+    cache.set(
+        RESOURCE_VERSION_KEY.format(resource=resource), time.time_ns(), timeout=None
+    )
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+DATASET_VERSION_KEY = "sql:dataset_version"
+RESULT_KEY = "sql:result:{version}:{digest}"
+PLAN_KEY = "sql:plan:{version}:{digest}"
+
+
+def get_dataset_version() -> int:
+    version = cache.get(DATASET_VERSION_KEY)
+    if version is None:
+        cache.add(DATASET_VERSION_KEY, 1, timeout=None)
+        version = cache.get(DATASET_VERSION_KEY, 1)
+    return version
+
+
+def bump_dataset_version() -> None:
+    """
+    Invalidate every cached result by moving to a new dataset version.
+
+    Entries stored under older versions are never read again and expire
+    through their TTL.
+    """
+    cache.add(DATASET_VERSION_KEY, 1, timeout=None)
+    cache.incr(DATASET_VERSION_KEY)
+
+
+def _versioned_key(template: str, prepared_sql: str) -> str:
+    digest = hashlib.sha1(prepared_sql.encode(), usedforsecurity=False).hexdigest()
+    return template.format(version=get_dataset_version(), digest=digest)
+
+
+def _result_key(prepared_sql: str) -> str:
+    return _versioned_key(RESULT_KEY, prepared_sql)
+
+
+def get_cached_result(prepared_sql: str) -> dict | None:
+    payload = cache.get(_result_key(prepared_sql))
+    if payload is None:
+        return None
+    return json.loads(zlib.decompress(payload))
+
+
+def cache_result(prepared_sql: str, result: dict) -> bool:
+    """
+    Store a query result compressed, unless it exceeds the size limit.
+
+    Returns:
+        True if the result was cached.
+    """
+    payload = zlib.compress(json.dumps(result, cls=DjangoJSONEncoder).encode())
+    if len(payload) > settings.SQL_RESULT_CACHE_MAX_BYTES:
+        return False
+    cache.set(_result_key(prepared_sql), payload, settings.SQL_RESULT_CACHE_TIMEOUT)
+    return True
+
+
+def get_cached_plan(prepared_sql: str) -> dict | None:
+    return cache.get(_versioned_key(PLAN_KEY, prepared_sql))
+
+
+def cache_plan(prepared_sql: str, plan: dict) -> None:
+    """
+    Store the planner estimates of a query for the current dataset version.
+
+    Plans depend on table statistics, so a reloaded dataset invalidates
+    them together with cached results.
+    """
+    cache.set(
+        _versioned_key(PLAN_KEY, prepared_sql), plan, settings.SQL_PLAN_CACHE_TIMEOUT
+    )
@@ -1,13 +1,58 @@
-from core.users.models import AvailableTable
+import hashlib
+import json
+
+from core.services.query_cache import LRUCache, get_allowed_tables, tables_fingerprint
+from core.users.models import AvailableTable, Case
 from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import connections
 
+SCHEMA_VERSION_KEY = "sql:schema_version"
+SCHEMA_KEY = "sql:schema:{version}:{case_id}:{fingerprint}"
+
+schema_cache = LRUCache(settings.SQL_SCHEMA_CACHE_SIZE)
+
+
+SCHEMA_QUERY = """
+    SELECT
+        t.relname,
+        a.attname,
+        format_type(a.atttypid, NULL),
+        EXISTS (
+            SELECT 1
+            FROM pg_constraint pk
+            WHERE pk.conrelid = t.oid
+                AND pk.contype = 'p'
+                AND a.attnum = ANY (pk.conkey)
+        ),
+        ft.relname,
+        fa.attname
+    FROM pg_class t
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    JOIN pg_attribute a
+        ON a.attrelid = t.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_constraint fk
+        ON fk.conrelid = t.oid
+        AND fk.contype = 'f'
+        AND fk.conkey[1] = a.attnum
+        AND cardinality(fk.conkey) = 1
+    LEFT JOIN pg_class ft ON ft.oid = fk.confrelid
+    LEFT JOIN pg_attribute fa
+        ON fa.attrelid = fk.confrelid AND fa.attnum = fk.confkey[1]
+    WHERE n.nspname = 'public' AND t.relname = ANY (%s)
+    ORDER BY t.relname, a.attnum
+"""
+
 
 def get_schema(case_id):
     """
     Get the database schema for tables available to a specific case.
 
+    Columns, primary keys and foreign keys of all tables are read from
+    pg_catalog in a single query.
+
     Args:
         case_id: The ID of the case to get the schema for.
 
@@ -25,102 +70,124 @@ def get_schema(case_id):
     if not allowed_tables:
         raise ObjectDoesNotExist(f"No available tables found for case {case_id}")
 
-    schema = []
-
     with connections["investigations"].cursor() as cursor:
-        for table in allowed_tables:
-            cursor.execute(
-                """
-                SELECT 
-                    c.column_name, 
-                    c.data_type,
-                    EXISTS (
-                        SELECT 1
-                        FROM information_schema.table_constraints tc
-                        JOIN information_schema.key_column_usage kcu
-                            ON tc.constraint_name = kcu.constraint_name
-                        WHERE tc.table_name = %s
-                            AND kcu.column_name = c.column_name
-                            AND tc.constraint_type = 'PRIMARY KEY'
-                    ) AS is_primary,
-                    EXISTS (
-                        SELECT 1
-                        FROM information_schema.table_constraints tc
-                        JOIN information_schema.key_column_usage kcu
-                            ON tc.constraint_name = kcu.constraint_name
-                        WHERE tc.table_name = %s
-                            AND kcu.column_name = c.column_name
-                            AND tc.constraint_type = 'FOREIGN KEY'
-                    ) AS is_foreign
-                FROM information_schema.columns c
-                WHERE c.table_name = %s;
-            """,
-                [table, table, table],
-            )
-            columns_raw = cursor.fetchall()
-
-            cursor.execute(
-                """
-                SELECT
-                    kcu.column_name AS from_column,
-                    ccu.table_name AS to_table,
-                    ccu.column_name AS to_column
-                FROM 
-                    information_schema.table_constraints AS tc
-                JOIN information_schema.key_column_usage AS kcu
-                    ON tc.constraint_name = kcu.constraint_name
-                JOIN information_schema.constraint_column_usage AS ccu
-                    ON ccu.constraint_name = tc.constraint_name
-                WHERE constraint_type = 'FOREIGN KEY' AND tc.table_name = %s;
-            """,
-                [table],
+        cursor.execute(SCHEMA_QUERY, [allowed_tables])
+        rows = cursor.fetchall()
+
+    models_by_table = apps.get_app_config("investigations").models_by_table
+    tables = {
+        table: {"tableName": table, "columns": [], "foreignKeys": []}
+        for table in allowed_tables
+    }
+    columns = {}
+    help_texts = {}
+
+    for table, column, data_type, is_primary, to_table, to_column in rows:
+        entry = tables[table]
+        if to_table:
+            entry["foreignKeys"].append(
+                {"fromColumn": column, "toTable": to_table, "toColumn": to_column}
             )
-            fkeys_raw = cursor.fetchall()
-
-            foreign_keys = [
-                {
-                    "fromColumn": fk[0],
-                    "toTable": fk[1],
-                    "toColumn": fk[2],
-                }
-                for fk in fkeys_raw
-            ]
-            foreign_columns = {fk["fromColumn"] for fk in foreign_keys}
-
-            investigations_app = apps.get_app_config("investigations")
-            investigations_models = investigations_app.get_models()
-
-            model = None
-            for m in investigations_models:
-                if m._meta.db_table == table:
-                    model = m
-                    break
-
-            model_fields_help = {}
+
+        # A column referenced by several foreign keys comes in several rows.
+        if (table, column) in columns:
+            columns[table, column]["isForeign"] |= bool(to_table)
+            continue
+
+        if table not in help_texts:
+            help_texts[table] = {}
+            model = models_by_table.get(table)
             if model:
                 for field in model._meta.fields:
                     help_text = field.help_text or ""
-                    model_fields_help[field.name] = help_text
-                    model_fields_help[field.column] = help_text
-
-            columns = []
-            for col in columns_raw:
-                columns.append(
-                    {
-                        "name": col[0],
-                        "type": col[1],
-                        "isPrimary": col[2],
-                        "isForeign": col[3] or col[0] in foreign_columns,
-                        "help_text": model_fields_help.get(col[0], ""),
-                    }
-                )
-
-            schema.append(
-                {
-                    "tableName": table,
-                    "columns": columns,
-                    "foreignKeys": foreign_keys,
-                }
-            )
+                    help_texts[table][field.name] = help_text
+                    help_texts[table][field.column] = help_text
+
+        columns[table, column] = {
+            "name": column,
+            "type": data_type,
+            "isPrimary": is_primary,
+            "isForeign": bool(to_table),
+            "help_text": help_texts[table].get(column, ""),
+        }
+        entry["columns"].append(columns[table, column])
+
+    return list(tables.values())
+
+
+def get_schema_version() -> int:
+    version = cache.get(SCHEMA_VERSION_KEY)
+    if version is None:
+        cache.add(SCHEMA_VERSION_KEY, 1, timeout=None)
+        version = cache.get(SCHEMA_VERSION_KEY, 1)
+    return version
+
+
+def bump_schema_version(**kwargs) -> None:
+    """
+    Invalidate every schema snapshot, e.g. after investigations migrations.
+
+    Accepts signal arguments so it can be connected to post_migrate.
+    """
+    cache.add(SCHEMA_VERSION_KEY, 1, timeout=None)
+    cache.incr(SCHEMA_VERSION_KEY)
 
-    return schema
+
+def get_schema_snapshot(case_id) -> dict:
+    """
+    Get the schema of a case together with its ETag.
+
+    Snapshots are kept in an in-process LRU cache backed by the shared
+    cache. The key contains the schema version and a fingerprint of the
+    case's allowed tables, so a migration or a changed AvailableTable set
+    makes every process rebuild the snapshot. Shared entries expire after
+    SQL_SCHEMA_CACHE_TIMEOUT, so those of old versions do not pile up.
+
+    Args:
+        case_id: The ID of the case to get the schema for.
+
+    Returns:
+        Dict with ``etag`` and ``schema`` as returned by ``get_schema``.
+
+    Raises:
+        ObjectDoesNotExist: If no available tables are found for the case.
+    """
+    allowed_tables = get_allowed_tables(case_id)
+    if not allowed_tables:
+        raise ObjectDoesNotExist(f"No available tables found for case {case_id}")
+
+    key = SCHEMA_KEY.format(
+        version=get_schema_version(),
+        case_id=case_id,
+        fingerprint=tables_fingerprint(allowed_tables),
+    )
+    snapshot = schema_cache.get(key)
+    if snapshot is None:
+        snapshot = cache.get(key)
+        if snapshot is None:
+            schema = get_schema(case_id)
+            payload = json.dumps(schema, sort_keys=True).encode()
+            snapshot = {
+                "etag": hashlib.sha1(payload, usedforsecurity=False).hexdigest(),
+                "schema": schema,
+            }
+            cache.set(key, snapshot, timeout=settings.SQL_SCHEMA_CACHE_TIMEOUT)
+        schema_cache.set(key, snapshot)
+    return snapshot
+
+
+def warm_schema_cache() -> int:
+    """
+    Build the schema snapshots of all cases ahead of the first request.
+
+    Returns:
+        Number of cases with a snapshot.
+    """
+    warmed = 0
+    for case_id in Case.objects.values_list("id", flat=True):
+        try:
+            get_schema_snapshot(case_id)
+        except ObjectDoesNotExist:
+            continue
+        warmed += 1
+    return warmed
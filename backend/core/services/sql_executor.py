@@ -1,127 +1,642 @@
-import re
-
-import sqlparse
-from core.users.models import AvailableTable
-from django.db import connections
-from sqlglot import exp, parse
-from sqlparse.tokens import DML, Keyword
-
-FORBIDDEN_KEYWORDS = {
-    "INSERT",
-    "UPDATE",
-    "DELETE",
-    "DROP",
-    "ALTER",
-    "TRUNCATE",
-    "CREATE",
-    "REPLACE",
-    "GRANT",
-    "REVOKE",
-    "INTO",
-    "MERGE",
-    "CALL",
-    "EXEC",
-}
-
-FORBIDDEN_PATTERNS = [
-    r"--",
-    r"/\*.*\*/",
-    r";",
-    r"\bRECURSIVE\b",
-    r"\bINTO\b",
-]
-
-
-def has_limit(token_list) -> bool:
-    for token in token_list.tokens:
-        if token.ttype is Keyword and token.value.upper() == "LIMIT":
-            return True
-        elif token.is_group:
-            if has_limit(token):
-                return True
-    return False
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import NamedTuple
+
+from core.services.connection_pool import PoolTimeout, get_player_pool
+from core.services.query_cache import (
+    get_allowed_tables,
+    get_or_validate,
+    get_query_limits,
+)
+from core.services.result_cache import (
+    cache_plan,
+    cache_result,
+    get_cached_plan,
+    get_cached_result,
+)
+from django.conf import settings
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.errors import QueryCanceled
+from sqlglot import exp
+from sqlglot.dialects.dialect import Dialect
+from sqlglot.errors import SqlglotError
+from sqlglot.tokens import TokenType
+
+DIALECT = Dialect.get_or_raise("postgres")
+
+DEFAULT_LIMIT = 1000
+FETCH_SIZE = 200
+PAGE_TOKEN_SALT = "core.services.sql_executor.page"
+
+FORBIDDEN_EXPRESSIONS = (
+    exp.Insert,
+    exp.Update,
+    exp.Delete,
+    exp.Drop,
+    exp.Alter,
+    exp.TruncateTable,
+    exp.Create,
+    exp.Merge,
+    exp.Grant,
+    exp.Command,
+    exp.Transaction,
+    exp.Set,
+    exp.Lock,
+)
+
+# Functions that change settings, sleep, reach other servers or the file
+# system, or act on other backends. set_config() in particular would lift
+# the limits execute_with_limits sets for the rest of the transaction.
+FORBIDDEN_FUNCTIONS = frozenset(
+    {
+        "set_config",
+        "current_setting",
+        "loread",
+        "lowrite",
+        "pg_stat_file",
+        "pg_cancel_backend",
+        "pg_terminate_backend",
+        "pg_reload_conf",
+        "pg_rotate_logfile",
+        "pg_switch_wal",
+        "pg_create_restore_point",
+        "pg_notify",
+        "query_to_xml",
+        "query_to_xml_and_xmlschema",
+        "query_to_xmlschema",
+        "cursor_to_xml",
+        "cursor_to_xmlschema",
+        "database_to_xml",
+        "database_to_xml_and_xmlschema",
+        "database_to_xmlschema",
+        "schema_to_xml",
+        "schema_to_xml_and_xmlschema",
+        "schema_to_xmlschema",
+        "table_to_xml",
+        "table_to_xml_and_xmlschema",
+        "table_to_xmlschema",
+    }
+)
+FORBIDDEN_FUNCTION_PREFIXES = (
+    "pg_sleep",
+    "dblink",
+    "lo_",
+    "pg_read_",
+    "pg_ls_",
+    "pg_file_",
+    "pg_logdir_",
+    "pg_advisory_",
+    "pg_try_advisory_",
+    "pg_backup_",
+    "pg_start_backup",
+    "pg_stop_backup",
+    "pg_promote",
+    "pg_replication_",
+    "pg_create_",
+    "pg_drop_",
+    "pg_log_",
+)
 
 
-def extract_tables(sql: str) -> set[str]:
+def is_forbidden_function(name: str) -> bool:
+    name = name.lower()
+    return name in FORBIDDEN_FUNCTIONS or name.startswith(FORBIDDEN_FUNCTION_PREFIXES)
+
+
+def parse_query(raw_sql: str) -> exp.Expression:
     try:
-        expressions = parse(sql)
-        tables = set()
-        for tree in expressions:
-            tables.update(
-                t.name
-                for t in tree.find_all(exp.Table)
-                if t and t.name  # type: ignore
-            )
-        return tables
-    except Exception:
-        return set()
+        tokens = DIALECT.tokenize(raw_sql)
+        expressions = DIALECT.parser().parse(tokens, raw_sql)
+    except SqlglotError:
+        raise ValueError("Пустой или некорректный SQL-запрос.")
 
+    statements = [e for e in expressions if e is not None]
+    if not statements:
+        raise ValueError("Пустой или некорректный SQL-запрос.")
 
-def contains_forbidden_keywords(token_list) -> bool:
-    for token in token_list.tokens:
-        if token.ttype in (Keyword, DML) and token.value.upper() in FORBIDDEN_KEYWORDS:
-            return True
-        elif token.is_group:
-            if contains_forbidden_keywords(token):
-                return True
-    return False
+    if len(statements) > 1 or any(
+        t.token_type == TokenType.SEMICOLON for t in tokens[:-1]
+    ):
+        raise ValueError("Запрос содержит запрещённые конструкции.")
+
+    return statements[0]
+
+
+def _references_cte(table: exp.Table) -> bool:
+    """
+    Return True if a bare table name resolves to a CTE in scope.
 
+    A CTE is visible in the body of the query that owns its WITH and in
+    the CTEs defined after it in the same WITH, never elsewhere: a CTE of
+    a subquery does not shadow a table of the same name outside it.
+    """
+    if table.db or table.catalog:
+        return False
 
-def contains_forbidden_patterns(raw_sql: str) -> bool:
-    for pattern in FORBIDDEN_PATTERNS:
-        if re.search(pattern, raw_sql, flags=re.IGNORECASE | re.DOTALL):
+    node = table
+    while node.parent is not None:
+        parent = node.parent
+        if isinstance(parent, exp.With):
+            visible = parent.expressions[: parent.expressions.index(node)]
+        elif isinstance(parent, exp.Query) and node is not parent.args.get("with"):
+            with_ = parent.args.get("with")
+            visible = with_.expressions if with_ else []
+        else:
+            visible = []
+        if any(cte.alias == table.name for cte in visible):
             return True
+        node = parent
     return False
 
 
+def check_query_tree(tree: exp.Expression, allowed_user_tables: set[str]) -> None:
+    if not isinstance(tree, exp.Query):
+        raise ValueError("Разрешён только SELECT-запрос.")
+
+    tables = []
+
+    for node in tree.walk():
+        if isinstance(node, FORBIDDEN_EXPRESSIONS):
+            raise ValueError("Запрос содержит запрещённые SQL-операции.")
+        if isinstance(node, exp.Into) or (
+            isinstance(node, exp.With) and node.args.get("recursive")
+        ):
+            raise ValueError("Запрос содержит запрещённые конструкции.")
+        # sqlglot has no classes of its own for these, so they parse as
+        # Anonymous whatever the case, quoting or schema of the name.
+        if isinstance(node, exp.Anonymous) and is_forbidden_function(node.name):
+            raise ValueError(f"Функция '{node.name}' в запросах запрещена.")
+        if isinstance(node, exp.Table) and node.name:
+            tables.append(node)
+
+    for table in tables:
+        if _references_cte(table):
+            continue
+        if table.catalog or table.db not in ("", "public"):
+            raise ValueError(f"Доступ к таблице '{table.sql()}' в этом кейсе запрещён.")
+        if table.name not in allowed_user_tables:
+            raise ValueError(f"Доступ к таблице '{table.name}' в этом кейсе запрещён.")
+
+
+def clamp_limits(tree: exp.Expression, max_limit: int) -> None:
+    """
+    Clamp every LIMIT and FETCH FIRST in the tree, subqueries included.
+
+    Counts that are not integer literals (LIMIT ALL, expressions) are
+    replaced with the maximum as well.
+    """
+    for node in tree.find_all(exp.Limit, exp.Fetch):
+        arg = "expression" if isinstance(node, exp.Limit) else "count"
+        count = node.args.get(arg)
+        if isinstance(node, exp.Fetch) and count is None:
+            continue
+        if not (
+            isinstance(count, exp.Literal)
+            and count.is_int
+            and int(count.this) <= max_limit
+        ):
+            node.set(arg, exp.Literal.number(max_limit))
+
+
 def validate_and_prepare_query(raw_sql: str, allowed_user_tables: set[str]) -> str:
-    cleaned_sql = (
-        sqlparse.format(raw_sql.strip(), strip_comments=True).strip().rstrip(";")
+    """
+    Validate a player query and return the SQL that should be executed.
+
+    The query is tokenized and parsed once with sqlglot; the statement type
+    check, the forbidden node check, table access check, LIMIT clamping and
+    LIMIT injection are all done over that single AST.
+
+    Raises:
+        ValueError: If the query is not allowed to run.
+    """
+    tree = parse_query(raw_sql.strip())
+    check_query_tree(tree, allowed_user_tables)
+    clamp_limits(tree, settings.SQL_MAX_LIMIT)
+
+    if not tree.args.get("limit") and not tree.args.get("fetch"):
+        tree = tree.limit(DEFAULT_LIMIT, copy=False)
+
+    return tree.sql(dialect=DIALECT, comments=False)
+
+
+class QueryLimitExceeded(Exception):
+    pass
+
+
+class QueryTimeout(QueryLimitExceeded):
+    pass
+
+
+def query_timeout(limits: dict) -> QueryTimeout:
+    return QueryTimeout(
+        f"Запрос выполнялся дольше {limits['statement_timeout']} мс и был остановлен."
     )
-    parsed = sqlparse.parse(cleaned_sql)
 
-    if not parsed:
-        raise ValueError("Пустой или некорректный SQL-запрос.")
 
-    statement = parsed[0]
+@contextmanager
+def statement_timeout_as_limit(limits: dict):
+    try:
+        yield
+    except QueryCanceled as e:
+        raise query_timeout(limits) from e
 
-    if statement.get_type() != "SELECT":
-        raise ValueError("Разрешён только SELECT-запрос.")
 
-    if contains_forbidden_patterns(cleaned_sql):
-        raise ValueError("Запрос содержит запрещённые конструкции.")
+@contextmanager
+def cancel_at(connection, deadline: float):
+    """
+    Cancel the statement running on ``connection`` at ``deadline``.
 
-    if contains_forbidden_keywords(statement):
-        raise ValueError("Запрос содержит запрещённые SQL-операции.")
+    The server restarts statement_timeout on every FETCH from a cursor, so
+    on its own it does not bound the query as a whole.
+    """
+    timer = threading.Timer(max(deadline - time.monotonic(), 0), connection.cancel)
+    timer.daemon = True
+    timer.start()
+    try:
+        yield
+    finally:
+        timer.cancel()
 
-    tables_in_query = extract_tables(cleaned_sql)
-    for table in tables_in_query:
-        if table is None:
-            continue
-        if table not in allowed_user_tables:
-            raise ValueError(f"Доступ к таблице '{table}' в этом кейсе запрещён.")
 
-    if not has_limit(statement):
-        cleaned_sql += " LIMIT 1000"
+def fetch_within_budget(
+    cursor, limits: dict, deadline: float | None = None
+) -> tuple[list, bool]:
+    """
+    Fetch rows in batches until the row cap is reached.
+
+    Args:
+        cursor: Cursor of the executed query.
+        limits: Resource limits of the case.
+        deadline: Optional ``time.monotonic()`` value after which no more
+            batches are fetched.
+
+    Returns:
+        The fetched rows and whether the result was truncated at the cap.
+
+    Raises:
+        QueryLimitExceeded: If the rows exceed the serialized byte budget.
+        QueryTimeout: If the deadline passes before the last batch.
+    """
+    rows = []
+    size = 0
+    max_rows = limits["max_rows"]
+
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise query_timeout(limits)
+        batch = cursor.fetchmany(min(FETCH_SIZE, max_rows + 1 - len(rows)))
+        if not batch:
+            break
+        for row in batch:
+            size += len(json.dumps(row, cls=DjangoJSONEncoder))
+            if size > limits["max_bytes"]:
+                raise QueryLimitExceeded(
+                    "Результат запроса больше "
+                    f"{limits['max_bytes']} байт. Уточните запрос."
+                )
+        rows.extend(batch)
+        if len(rows) > max_rows:
+            return rows[:max_rows], True
+
+    return rows, False
+
+
+def explain_query(sql: str) -> dict:
+    """
+    Return the planner estimates for a prepared query.
+
+    Runs EXPLAIN without executing the query. Estimates are cached per
+    dataset version, so a repeated query costs no round trip.
+
+    Returns:
+        Dict with ``total_cost`` and ``plan_rows`` of the top plan node.
+    """
+    plan = get_cached_plan(sql)
+    if plan is None:
+        with get_player_pool().connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                top = cursor.fetchone()[0][0]["Plan"]
+        plan = {"total_cost": top["Total Cost"], "plan_rows": top["Plan Rows"]}
+        cache_plan(sql, plan)
+    return plan
 
-    return cleaned_sql
 
+def check_query_cost(plan: dict, limits: dict) -> None:
+    """
+    Reject a query whose planner estimates exceed the limits of its case.
 
-def run_validated_sql_query(user_id: int, case_id: int, raw_sql: str) -> dict:
-    allowed_tables = set(
-        AvailableTable.objects.filter(case_id=case_id).values_list("table", flat=True)
+    Raises:
+        QueryLimitExceeded: If the estimated cost or row count is too high.
+    """
+    if plan["total_cost"] > limits["max_cost"]:
+        raise QueryLimitExceeded(
+            f"Запрос слишком тяжёлый: оценка стоимости {plan['total_cost']:.0f} "
+            f"больше допустимой {limits['max_cost']}. Добавьте условия отбора "
+            "или уберите лишние соединения таблиц."
+        )
+    if plan["plan_rows"] > limits["max_plan_rows"]:
+        raise QueryLimitExceeded(
+            f"Запрос вернёт около {plan['plan_rows']} строк, допустимо не больше "
+            f"{limits['max_plan_rows']}. Уточните запрос."
+        )
+
+
+@lru_cache(maxsize=256)
+def _pageable_tree(sql: str) -> exp.Query | None:
+    tree = parse_query(sql)
+    if not tree.args.get("order"):
+        return None
+
+    limit = tree.args.get("limit")
+    if isinstance(limit, exp.Fetch):
+        options = limit.args.get("limit_options")
+        if options is not None and options.args.get("with_ties"):
+            return None
+        count = limit.args.get("count")
+    else:
+        count = limit.expression if limit else None
+    offset = tree.args.get("offset")
+    if not _is_int_literal(count) or (
+        offset is not None and not _is_int_literal(offset.expression)
+    ):
+        return None
+    return tree
+
+
+def _is_int_literal(node) -> bool:
+    return isinstance(node, exp.Literal) and node.is_int
+
+
+def is_pageable(sql: str) -> bool:
+    """
+    Return True if later pages of a prepared query can be fetched.
+
+    Only queries with a top-level ORDER BY are paged: without one Postgres
+    may return the rows in a different order on every execution, so
+    consecutive pages could repeat or skip rows. Ties in the ORDER BY are
+    still up to the player to break.
+    """
+    return _pageable_tree(sql) is not None
+
+
+def page_query(sql: str, offset: int, page_size: int) -> str:
+    """
+    Return the SQL of one page of a prepared query.
+
+    Pages of an ordered query are cut by its own LIMIT and OFFSET, so they
+    follow its ORDER BY and Postgres can stop as soon as the page is full.
+    One extra row tells whether there is a next page.
+
+    Raises:
+        ValueError: If a later page is requested for a query that cannot
+            be paged.
+    """
+    tree = _pageable_tree(sql)
+    if tree is None:
+        if offset:
+            raise ValueError(
+                "Следующие страницы доступны только для запросов с ORDER BY."
+            )
+        return f"SELECT * FROM ({sql}) AS page LIMIT {page_size + 1}"
+
+    limit = tree.args["limit"]
+    count = int(
+        (limit.args["count"] if isinstance(limit, exp.Fetch) else limit.expression).this
     )
+    start = int(tree.args["offset"].expression.this) if tree.args.get("offset") else 0
+    page = tree.copy()
+    page.set("limit", None)
+    page = page.limit(max(min(page_size + 1, count - offset), 0), copy=False)
+    page = page.offset(start + offset, copy=False)
+    return page.sql(dialect=DIALECT, comments=False)
 
+
+def make_page_token(case_id: int, sql: str, offset: int) -> str:
+    return signing.dumps(
+        {"case_id": case_id, "sql": sql, "offset": offset},
+        salt=PAGE_TOKEN_SALT,
+        compress=True,
+    )
+
+
+def read_page_token(case_id: int, token: str) -> tuple[str, int]:
+    """
+    Return the prepared SQL and row offset stored in a continuation token.
+
+    Raises:
+        ValueError: If the token is malformed, expired or issued for
+            another case.
+    """
     try:
-        validated_sql = validate_and_prepare_query(raw_sql, allowed_tables)
+        data = signing.loads(
+            token, salt=PAGE_TOKEN_SALT, max_age=settings.SQL_PAGE_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        data = None
+    if not data or data.get("case_id") != case_id:
+        raise ValueError("Некорректный или устаревший токен страницы.")
+    return data["sql"], data["offset"]
+
+
+def execute_with_limits(
+    sql: str,
+    limits: dict,
+    offset: int = 0,
+    estimated_rows: int | None = None,
+    deadline: float | None = None,
+) -> dict:
+    """
+    Execute one page of a prepared query within the resource limits of its
+    case.
+
+    The query runs on a pooled read-only connection. The statement timeout
+    and work_mem are set for its transaction only, so they never leak to
+    other queries on the connection. Rows are streamed from a server-side
+    cursor in batches and fetching stops at the row cap, which is also the
+    page size, so worker memory does not depend on the LIMIT written by the
+    player. When the page is truncated, ``total`` is ``estimated_rows``, the
+    planner estimate for the whole query, instead of the exact row count.
+
+    The statement timeout covers the query as a whole: the server applies
+    it to each FETCH, so the fetch loop also keeps a deadline and the query
+    is cancelled from the client when it passes.
+
+    Args:
+        sql: Prepared query.
+        limits: Resource limits of the case.
+        offset: Row offset of the page.
+        estimated_rows: Planner estimate of the number of rows.
+        deadline: Optional ``time.monotonic()`` value the whole run, the
+            connection checkout included, must finish by. The query then
+            only takes a connection that is free right away.
+
+    Raises:
+        QueryLimitExceeded: If the timeout or the byte budget is exceeded.
+        PoolTimeout: If no connection is free.
+    """
+    pool_timeout = 0 if deadline is not None else None
+    with get_player_pool().connection(pool_timeout) as connection:
+        if deadline is None:
+            deadline = time.monotonic() + limits["statement_timeout"] / 1000
+        remaining = math.ceil((deadline - time.monotonic()) * 1000)
+        if remaining <= 0:
+            raise query_timeout(limits)
+        with connection.cursor() as cursor:
+            # Same as SET LOCAL, but both settings in one round trip.
+            cursor.execute(
+                "SELECT set_config('statement_timeout', %s, true), "
+                "set_config('work_mem', %s, true)",
+                [
+                    str(min(limits["statement_timeout"], remaining)),
+                    f"{limits['work_mem']}kB",
+                ],
+            )
+
+        with statement_timeout_as_limit(limits), cancel_at(connection, deadline):
+            with connection.cursor(name="player_query") as cursor:
+                cursor.execute(page_query(sql, offset, limits["max_rows"]))
+                rows, truncated = fetch_within_budget(cursor, limits, deadline)
+                # Named cursors only know their description after a fetch.
+                columns = [col[0] for col in cursor.description]  # type: ignore
+
+    total = estimated_rows if truncated else offset + len(rows)
+
+    return {
+        "columns": columns,
+        "rows": rows,
+        "truncated": truncated,
+        "total": total,
+        "offset": offset,
+    }
+
+
+class AdmittedQuery(NamedTuple):
+    sql: str
+    offset: int
+    limits: dict
+    plan: dict
+
+
+def admit_query(
+    case_id: int, raw_sql: str, page_token: str | None = None
+) -> AdmittedQuery:
+    """
+    Validate a player query and check its planner estimates before it runs.
+
+    Both steps are cached, so the check is cheap enough to run in the web
+    process before a query is queued, keeping heavy queries away from the
+    workers.
+
+    Raises:
+        ValueError: If the query or the page token is invalid.
+        QueryLimitExceeded: If the query is estimated to be too expensive.
+    """
+    offset = 0
+    if page_token:
+        raw_sql, offset = read_page_token(case_id, page_token)
+    sql = get_or_validate(
+        raw_sql, get_allowed_tables(case_id), validate_and_prepare_query
+    )
+
+    limits = get_query_limits(case_id)
+    plan = explain_query(sql)
+    check_query_cost(plan, limits)
+    return AdmittedQuery(sql, offset, limits, plan)
+
+
+def run_admitted_query(
+    case_id: int,
+    query: AdmittedQuery,
+    statement_timeout: int | None = None,
+    deadline: float | None = None,
+) -> dict:
+    """
+    Run one page of an admitted query, reusing a cached result if any.
+
+    Args:
+        case_id: Case the query belongs to, used for the page token.
+        query: Result of ``admit_query``.
+        statement_timeout: Optional tighter timeout in milliseconds.
+        deadline: Optional ``time.monotonic()`` value to finish by, see
+            ``execute_with_limits``.
+
+    Raises:
+        QueryLimitExceeded: If a resource limit is exceeded.
+    """
+    limits = query.limits
+    if statement_timeout is not None:
+        limits = {
+            **limits,
+            "statement_timeout": min(limits["statement_timeout"], statement_timeout),
+        }
+    max_rows = limits["max_rows"]
+    cache_key = page_query(query.sql, query.offset, max_rows)
+
+    result = get_cached_result(cache_key)
+    if result is None:
+        result = execute_with_limits(
+            query.sql, limits, query.offset, query.plan["plan_rows"], deadline
+        )
+        cache_result(cache_key, result)
+
+    result["next_page"] = (
+        make_page_token(case_id, query.sql, query.offset + max_rows)
+        if result["truncated"] and is_pageable(query.sql)
+        else None
+    )
+    return result
+
+
+def run_inline(case_id: int, query: AdmittedQuery) -> dict | None:
+    """
+    Run a cheap admitted query in the calling process.
+
+    Queries with a plan cost above SQL_INLINE_MAX_COST are not attempted.
+    The whole run, the connection checkout included, gets
+    SQL_INLINE_STATEMENT_TIMEOUT at most and never waits for a connection.
+
+    Returns:
+        The query result, or None if the query should go to a Celery
+        worker instead because it is too expensive, ran out of the inline
+        time budget or no connection was free.
+
+    Raises:
+        OperationalError: If the investigations database is unreachable.
+    """
+    if query.plan["total_cost"] > settings.SQL_INLINE_MAX_COST:
+        return None
+    timeout = settings.SQL_INLINE_STATEMENT_TIMEOUT
+    deadline = time.monotonic() + timeout / 1000
+    try:
+        return run_admitted_query(case_id, query, timeout, deadline)
+    except (QueryTimeout, PoolTimeout):
+        return None
+    except QueryCanceled as e:
+        return {"error": str(e)}
+    except (OperationalError, InterfaceError):
+        raise
     except Exception as e:
         return {"error": str(e)}
 
+
+def run_validated_sql_query(
+    user_id: int, case_id: int, raw_sql: str, page_token: str | None = None
+) -> dict:
+    """
+    Validate and run a player query, or continue it from a page token.
+
+    The result carries ``next_page``, an opaque token for the following
+    page when the current one was cut at the row cap.
+    """
     try:
-        with connections["investigations"].cursor() as cursor:
-            cursor.execute(validated_sql)
-            columns = [col[0] for col in cursor.description]  # type: ignore
-            rows = cursor.fetchall()
-            return {"columns": columns, "rows": rows}
+        query = admit_query(case_id, raw_sql, page_token)
+        return run_admitted_query(case_id, query)
     except Exception as e:
         return {"error": str(e)}
@@ -0,0 +1,62 @@
+from core.users.models import Case, User, UserProgress
+from django.db import connections
+
+# WHERE true keeps SQLite from reading ON CONFLICT as part of the SELECT.
+_FAN_OUT_SQL = """
+    INSERT INTO {progress} (user_id, case_id, status)
+    SELECT {user_id}, {case_id}, %s
+    FROM {source}
+    WHERE true
+    ON CONFLICT DO NOTHING
+"""
+
+
+def _fan_out(source, user_id, case_id, params) -> int:
+    sql = _FAN_OUT_SQL.format(
+        progress=UserProgress._meta.db_table,
+        source=source,
+        user_id=user_id,
+        case_id=case_id,
+    )
+    with connections["users"].cursor() as cursor:
+        cursor.execute(sql, [*params, "не начато"])
+        return cursor.rowcount
+
+
+def create_progress_for_case(case_id: int) -> int:
+    """
+    Create a "не начато" progress row for every user in a new case.
+
+    The rows are inserted by a single INSERT ... SELECT, so the cost does
+    not grow with a query per user. Existing rows are left untouched.
+
+    Returns:
+        Number of inserted rows.
+    """
+    return _fan_out(User._meta.db_table, "id", "%s", [case_id])
+
+
+def create_progress_for_user(user_id: int) -> int:
+    """
+    Create a "не начато" progress row in every case for a new user.
+
+    Returns:
+        Number of inserted rows.
+    """
+    return _fan_out(Case._meta.db_table, "%s", "id", [user_id])
+
+
+def get_user_progress(user_id):
+    """
+    Return the status of every case for a user.
+
+    Cases without a progress row are reported as "не начато", which is
+    what a missing row means with lazy progress.
+    """
+    statuses = dict(
+        UserProgress.objects.filter(user_id=user_id).values_list("case_id", "status")
+    )
+    return [
+        {"case_id": case_id, "status": statuses.get(case_id, "не начато")}
+        for case_id in Case.objects.values_list("id", flat=True)
+    ]
@@ -0,0 +1,73 @@
+import struct
+from datetime import date
+
+from django.test import SimpleTestCase
+
+from core.investigations.models import Charge
+from core.services.generator.copy_writer import (
+    CopyStream,
+    CopyWriter,
+    column_encoders,
+)
+
+
+def read_all(stream, size):
+    chunks = []
+    while chunk := stream.read(size):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class CopyStreamTest(SimpleTestCase):
+    def test_rows_are_encoded_in_binary_copy_format(self):
+        stream = CopyStream(
+            [(1, 2, 3, date(2000, 1, 3), "ёж"), (4, 5, 6, date(1999, 12, 31), None)],
+            column_encoders(Charge._meta.concrete_fields),
+        )
+
+        self.assertEqual(
+            stream.read(),
+            b"PGCOPY\n\xff\r\n\x00"
+            + struct.pack("!ii", 0, 0)
+            + struct.pack("!hiqiiiqii", 5, 8, 1, 4, 2, 8, 3, 4, 2)
+            + struct.pack("!i", 4)
+            + "ёж".encode()
+            + struct.pack("!hiqiiiqii", 5, 8, 4, 4, 5, 8, 6, 4, -1)
+            + struct.pack("!i", -1)
+            + struct.pack("!h", -1),
+        )
+        self.assertEqual(stream.rows, 2)
+
+    def test_small_reads_return_the_same_bytes(self):
+        encoders = column_encoders(Charge._meta.concrete_fields)
+        rows = [(i, 100 + i, i, date(2020, 1, 1), "осужден") for i in range(50)]
+
+        self.assertEqual(
+            read_all(CopyStream(rows, encoders), 7),
+            CopyStream(rows, encoders).read(),
+        )
+
+    def test_foreign_keys_use_the_target_column_type(self):
+        fields = Charge._meta.concrete_fields
+        encoders = column_encoders(fields)
+
+        # article.id is an IntegerField, suspect.id a BigAutoField.
+        self.assertEqual(encoders[1](7), struct.pack("!ii", 4, 7))
+        self.assertEqual(encoders[2](7), struct.pack("!iq", 8, 7))
+
+
+class CopyWriterTest(SimpleTestCase):
+    def test_suspects_get_distinct_persons(self):
+        writer = CopyWriter(persons=1000, suspects=1000, charges=0)
+
+        person_ids = [person_id for _, person_id, _ in writer.suspect_rows()]
+
+        self.assertEqual(sorted(person_ids), list(range(1, 1001)))
+
+    def test_more_suspects_than_persons_is_rejected(self):
+        with self.assertRaises(ValueError):
+            CopyWriter(persons=10, suspects=11)
+
+    def test_only_postgresql_is_supported(self):
+        with self.assertRaises(ValueError):
+            CopyWriter(persons=10, suspects=5).run()
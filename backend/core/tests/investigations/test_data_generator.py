@@ -0,0 +1,189 @@
+import re
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase
+
+from core.investigations.models import (
+    Alibi,
+    Article,
+    Case,
+    Charge,
+    CrimeScene,
+    Evidence,
+    Person,
+    Statement,
+    Suspect,
+    SuspectCase,
+)
+from core.services.generator.data.tables import (
+    CLOTHES,
+    EVIDENCE_CATALOG,
+    EVIDENCE_TYPES_BY_CRIME_TYPE,
+    ITEM_COLORS,
+    find_colors,
+)
+from core.services.generator.data_generator import InvestigationsDataGenerator
+from core.services.generator.utils.utils import (
+    get_available_evidence_types,
+    get_color_options,
+    get_description,
+    get_descriptions,
+    get_sample_suspects,
+)
+
+
+class InvestigationsDataGeneratorTest(TestCase):
+    databases = {"investigations"}
+
+    def generate(self, batch_size=7):
+        generator = InvestigationsDataGenerator(batch_size=batch_size)
+        generator.generate_persons(count=60)
+        generator.generate_cases()
+        generator.generate_suspects(count=20)
+        generator.generate_case_suspect()
+        generator.generate_articles()
+        generator.generate_charges(count=10)
+        generator.generate_alibis()
+        generator.generate_statements()
+        generator.generate_crime_scenes()
+        generator.generate_evidence()
+        return generator
+
+    def test_stages_write_all_rows(self):
+        generator = self.generate()
+
+        counts = [
+            (Person, generator.persons),
+            (Case, generator.cases),
+            (Suspect, generator.suspects),
+            (Article, generator.articles),
+            (Charge, generator.charges),
+            (Alibi, generator.alibis),
+            (Statement, generator.statements),
+            (CrimeScene, generator.scenes),
+            (Evidence, generator.evidence),
+            (SuspectCase, generator.case_suspects),
+        ]
+        for model, rows in counts:
+            with self.subTest(model=model.__name__):
+                self.assertEqual(
+                    model.objects.using("investigations").count(), len(rows)
+                )
+        self.assertEqual(Person.objects.using("investigations").count(), 60)
+        self.assertEqual(Suspect.objects.using("investigations").count(), 20)
+        self.assertEqual(Charge.objects.using("investigations").count(), 10)
+
+    def test_bulk_created_rows_have_primary_keys(self):
+        generator = self.generate()
+
+        self.assertTrue(all(person.pk for person in generator.persons))
+        self.assertTrue(all(case.pk for case in generator.cases))
+        self.assertEqual(
+            set(
+                SuspectCase.objects.using("investigations").values_list(
+                    "case_id", "suspect_id"
+                )
+            ),
+            set(generator.case_suspects),
+        )
+
+    @patch("core.services.generator.data_generator.bump_dataset_version")
+    def test_dataset_version_is_bumped_on_commit(self, bump):
+        generator = InvestigationsDataGenerator()
+
+        with (
+            patch("core.services.generator.data_generator.connections"),
+            self.captureOnCommitCallbacks(using="investigations") as callbacks,
+        ):
+            generator.run(persons=10, suspects=3, charges=2)
+        bump.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        bump.assert_called_once_with()
+
+    def test_stage_is_written_in_batches(self):
+        generator = InvestigationsDataGenerator(batch_size=10)
+
+        # Savepoint, three INSERTs of ten rows, release.
+        with self.assertNumQueries(5, using="investigations"):
+            generator.generate_persons(count=30)
+
+    def test_created_rows_are_indexed_by_id(self):
+        generator = self.generate()
+
+        self.assertEqual(
+            generator.by_id[Suspect],
+            {suspect.pk: suspect for suspect in generator.suspects},
+        )
+        for alibi in generator.alibis:
+            self.assertIs(generator.by_id[Case][alibi.case_id], alibi.case)
+
+
+class GetSampleSuspectsTest(TestCase):
+    def test_excluded_ids_are_never_sampled(self):
+        ids = list(range(10))
+
+        for _ in range(100):
+            sample = get_sample_suspects(3, ids, exclude={0, 1})
+            self.assertEqual(len(set(sample)), 3)
+            self.assertFalse({0, 1} & set(sample))
+
+    def test_sample_is_capped_by_remaining_ids(self):
+        self.assertCountEqual(get_sample_suspects(5, [1, 2, 3], exclude={2}), [1, 3])
+
+
+class GetDescriptionsTest(SimpleTestCase):
+    names = ["Иванов Иван Петрович", "Смирнова Анна Сергеевна"]
+    jobs = ["Повар", "Юрист"]
+
+    def test_one_description_per_person_in_order(self):
+        descriptions = get_descriptions(self.names * 50, self.jobs * 50)
+
+        self.assertEqual(len(descriptions), 100)
+        for index, description in enumerate(descriptions):
+            if index % 2:
+                self.assertIn(" женщина ", description)
+                self.assertIn("Профессия: Юрист", description)
+            else:
+                self.assertIn(" мужчина ", description)
+                self.assertIn("Профессия: Повар", description)
+
+    def test_distribution_matches_get_description(self):
+        count = 20_000
+        batched = get_descriptions(self.names[:1] * count, self.jobs[:1] * count)
+        single = [get_description(self.names[0], self.jobs[0]) for _ in range(count)]
+
+        for descriptions in (batched, single):
+            heights = [int(re.search(r"(\d+) см", d).group(1)) for d in descriptions]
+            self.assertEqual((min(heights), max(heights)), (170, 200))
+            with_details = sum("Привычки" in d for d in descriptions) / count
+            self.assertAlmostEqual(with_details, 0.15, delta=0.02)
+            traits = [d.split("Особые приметы: ")[1] for d in descriptions]
+            self.assertAlmostEqual(
+                sum(t.count(", ") for t in traits) / count, 1.0, delta=0.05
+            )
+
+
+class LookupTablesTest(SimpleTestCase):
+    def test_item_colors_cover_every_clothing_item(self):
+        for gender, colors in ITEM_COLORS.items():
+            for part in CLOTHES.values():
+                for item in part[gender]:
+                    self.assertIs(colors[item], find_colors(gender, item))
+
+    def test_unknown_item_falls_back_to_the_scan(self):
+        self.assertIs(
+            get_color_options("муж", "синяя футболка"), ITEM_COLORS["муж"]["футболка"]
+        )
+
+    def test_evidence_types_keep_catalog_order(self):
+        crime_types = {c for by_crime in EVIDENCE_CATALOG.values() for c in by_crime}
+
+        self.assertEqual(set(EVIDENCE_TYPES_BY_CRIME_TYPE), crime_types)
+        for crime_type in crime_types:
+            self.assertEqual(
+                get_available_evidence_types(crime_type),
+                [t for t in EVIDENCE_CATALOG if crime_type in EVIDENCE_CATALOG[t]],
+            )
+        self.assertEqual(get_available_evidence_types("нет такого"), [])
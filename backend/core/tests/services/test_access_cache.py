@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.services.access_cache import (
+    get_case,
+    get_user_xp,
+    invalidate_case,
+    invalidate_user_xp,
+)
+from core.services.answer_checker import check_answer
+from core.users.models import Case, User
+
+
+class AccessCacheTests(TestCase):
+    databases = {"users"}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="test", password="12345678")
+        self.case = Case.objects.create(
+            title="A",
+            description="A",
+            short_description="A",
+            required_xp=0,
+            reward_xp=100,
+            answer="A",
+        )
+
+    def test_case_is_cached(self):
+        get_case(self.case.id)
+
+        with self.assertNumQueries(0, using="users"):
+            self.assertEqual(get_case(self.case.id).title, "A")
+
+    def test_case_invalidation(self):
+        get_case(self.case.id)
+        Case.objects.filter(pk=self.case.id).update(title="B")
+        invalidate_case(self.case.id)
+
+        self.assertEqual(get_case(self.case.id).title, "B")
+
+    def test_user_xp_is_cached(self):
+        get_user_xp(self.user.id)
+
+        with self.assertNumQueries(0, using="users"):
+            self.assertEqual(get_user_xp(self.user.id), 0)
+
+    def test_user_xp_invalidation(self):
+        get_user_xp(self.user.id)
+        User.objects.filter(pk=self.user.id).update(xp=50)
+        invalidate_user_xp(self.user.id)
+
+        self.assertEqual(get_user_xp(self.user.id), 50)
+
+    def test_correct_answer_invalidates_xp(self):
+        get_user_xp(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True, using="users"):
+            check_answer("A", self.case.id, self.user.id)
+
+        self.assertEqual(get_user_xp(self.user.id), 100)
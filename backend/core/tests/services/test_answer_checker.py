@@ -0,0 +1,86 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.services.answer_checker import check_answer
+from core.services.answer_index import answer_index
+from core.users.models import Case, User, UserProgress
+
+
+class CheckAnswerTests(TestCase):
+    databases = {"users"}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="test", password="12345678")
+        self.case = Case.objects.create(
+            title="A",
+            description="A",
+            short_description="A",
+            required_xp=0,
+            reward_xp=100,
+            answer="Иванов Иван",
+        )
+
+    def status(self):
+        return UserProgress.objects.get(user=self.user, case=self.case).status
+
+    def xp(self):
+        return User.objects.values_list("xp", flat=True).get(pk=self.user.pk)
+
+    def test_correct_answer_rewards_once(self):
+        self.assertTrue(check_answer(" иванов   ИВАН ", self.case.id, self.user.id))
+        self.assertTrue(check_answer("Иванов Иван", self.case.id, self.user.id))
+
+        self.assertEqual(self.status(), "завершено")
+        self.assertEqual(self.xp(), 100)
+
+    def test_wrong_answer_marks_in_progress(self):
+        self.assertFalse(check_answer("Петров", self.case.id, self.user.id))
+
+        self.assertEqual(self.status(), "в процессе")
+        self.assertEqual(self.xp(), 0)
+
+    def test_wrong_answer_keeps_completed_case(self):
+        check_answer("Иванов Иван", self.case.id, self.user.id)
+        check_answer("Петров", self.case.id, self.user.id)
+
+        self.assertEqual(self.status(), "завершено")
+
+    def test_missing_progress_is_created(self):
+        UserProgress.objects.all().delete()
+
+        check_answer("Иванов Иван", self.case.id, self.user.id)
+
+        self.assertEqual(self.status(), "завершено")
+        self.assertEqual(self.xp(), 100)
+
+    def test_correct_answer_uses_conditional_updates(self):
+        answer_index.get(self.case.id)
+
+        # Conditional progress UPDATE and XP UPDATE, plus the savepoint
+        # pair of the atomic block inside the test transaction.
+        with self.assertNumQueries(4, using="users"):
+            check_answer("Иванов Иван", self.case.id, self.user.id)
+
+    def test_leaderboard_reads_xp_after_commit(self):
+        with (
+            patch("core.services.answer_checker.leaderboard.sync_xp") as sync_xp,
+            self.captureOnCommitCallbacks(execute=True, using="users"),
+        ):
+            check_answer("Иванов Иван", self.case.id, self.user.id)
+
+        sync_xp.assert_called_once_with([self.user.id])
+
+    def test_answer_change_reloads_index(self):
+        answer_index.get(self.case.id)
+        self.case.answer = "Петров"
+        with self.captureOnCommitCallbacks(execute=True, using="users"):
+            self.case.save()
+
+        self.assertTrue(check_answer("петров", self.case.id, self.user.id))
+
+    def test_unknown_case(self):
+        with self.assertRaises(Case.DoesNotExist):
+            check_answer("Петров", 0, self.user.id)
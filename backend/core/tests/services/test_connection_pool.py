@@ -0,0 +1,165 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+from psycopg2 import OperationalError
+
+from core.services import connection_pool
+from core.services.connection_pool import (
+    PlayerConnectionPool,
+    PoolTimeout,
+    get_player_pool,
+    get_player_pool_stats,
+)
+
+
+class PlayerConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        patcher = patch("core.services.connection_pool.ThreadedConnectionPool")
+        self.backend = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.backend.getconn.side_effect = lambda: MagicMock(closed=0)
+
+    def make_pool(self, **kwargs):
+        options = {
+            "min_size": 1,
+            "max_size": 1,
+            "timeout": 0.01,
+            "health_check_interval": 0,
+            "metrics_interval": 60,
+        }
+        return PlayerConnectionPool(**{**options, **kwargs})
+
+    def test_connection_is_rolled_back_and_returned(self):
+        pool = self.make_pool()
+
+        with pool.connection() as connection:
+            self.assertEqual(pool.stats()["in_use"], 1)
+
+        connection.rollback.assert_called_once()
+        self.backend.putconn.assert_called_once_with(connection)
+        self.assertEqual(pool.stats()["in_use"], 0)
+        self.assertEqual(pool.stats()["checkouts"], 1)
+
+    def test_waits_then_times_out_when_exhausted(self):
+        pool = self.make_pool()
+        checked_out = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with pool.connection():
+                checked_out.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        checked_out.wait()
+        try:
+            with self.assertRaises(PoolTimeout):
+                with pool.connection():
+                    pass
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_zero_timeout_does_not_wait(self):
+        pool = self.make_pool(timeout=10)
+
+        with pool.connection():
+            with self.assertRaises(PoolTimeout):
+                with pool.connection(timeout=0):
+                    pass
+
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_broken_idle_connection_is_replaced(self):
+        pool = self.make_pool()
+        broken = MagicMock(closed=0)
+        broken.cursor.return_value.__enter__.return_value.execute.side_effect = (
+            OperationalError()
+        )
+        self.backend.getconn.side_effect = [broken, broken, MagicMock(closed=0)]
+
+        with pool.connection():
+            pass
+        with pool.connection() as connection:
+            self.assertIsNot(connection, broken)
+
+        self.backend.putconn.assert_any_call(broken, close=True)
+        self.assertEqual(pool.stats()["discarded"], 1)
+
+
+POOL_OPTIONS = {
+    "USER": "player",
+    "PASSWORD": "secret",
+    "MIN_SIZE": 1,
+    "MAX_SIZE": 2,
+    "TIMEOUT": 5,
+    "CONNECT_TIMEOUT": 3,
+    "HEALTH_CHECK_INTERVAL": 30,
+    "METRICS_INTERVAL": 60,
+}
+
+
+@override_settings(SQL_PLAYER_POOL=POOL_OPTIONS)
+class GetPlayerPoolTests(SimpleTestCase):
+    def setUp(self):
+        patcher = patch("core.services.connection_pool.PlayerConnectionPool")
+        self.pool_class = patcher.start()
+        self.pool_class.side_effect = lambda **kwargs: MagicMock()
+        self.addCleanup(patcher.stop)
+        for name, value in [("_pool", None), ("_pool_pid", None)]:
+            patcher = patch.object(connection_pool, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_pool_is_created_once(self):
+        pool = get_player_pool()
+
+        self.assertIs(get_player_pool(), pool)
+        self.pool_class.assert_called_once()
+        kwargs = self.pool_class.call_args.kwargs
+        self.assertEqual(kwargs["connect_timeout"], 3)
+        self.assertEqual(kwargs["user"], "player")
+
+    def test_pool_is_not_created_under_lock(self):
+        def create(**kwargs):
+            self.assertFalse(connection_pool._pool_lock.locked())
+            return MagicMock()
+
+        self.pool_class.side_effect = create
+
+        get_player_pool()
+
+    def test_pool_created_concurrently_is_closed(self):
+        existing, created = MagicMock(), MagicMock()
+
+        def create(**kwargs):
+            # Another thread installs its pool while this one connects.
+            connection_pool._pool = existing
+            connection_pool._pool_pid = connection_pool.os.getpid()
+            return created
+
+        self.pool_class.side_effect = create
+
+        self.assertIs(get_player_pool(), existing)
+        created.close.assert_called_once()
+        existing.close.assert_not_called()
+
+    @override_settings(SQL_PLAYER_POOL={**POOL_OPTIONS, "USER": None})
+    def test_owner_role_fallback_warns(self):
+        with patch("core.services.connection_pool.logger") as logger:
+            get_player_pool()
+
+        logger.warning.assert_called_once()
+        self.assertNotEqual(self.pool_class.call_args.kwargs["user"], "player")
+
+    def test_stats_without_pool(self):
+        self.assertIsNone(get_player_pool_stats())
+
+    def test_stats(self):
+        get_player_pool().stats.return_value = {"in_use": 0}
+
+        self.assertEqual(get_player_pool_stats(), {"in_use": 0})
@@ -0,0 +1,118 @@
+from unittest.mock import MagicMock, patch
+
+import redis
+from django.test import TestCase
+
+from core.services import leaderboard
+from core.users.models import User
+
+
+class LeaderboardTests(TestCase):
+    databases = {"users"}
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="1", xp=300)
+        self.bob = User.objects.create_user(username="bob", password="1", xp=200)
+        self.client = MagicMock()
+        patcher = patch(
+            "core.services.leaderboard.get_client", return_value=self.client
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_top(self):
+        self.client.zrevrange.return_value = [
+            (str(self.alice.pk).encode(), 300.0),
+            (str(self.bob.pk).encode(), 200.0),
+        ]
+
+        top = leaderboard.get_top(2)
+
+        self.client.zrevrange.assert_called_once_with(
+            leaderboard.LEADERBOARD_KEY, 0, 1, withscores=True
+        )
+        self.assertEqual(
+            top,
+            [
+                {"rank": 1, "user_id": self.alice.pk, "username": "alice", "xp": 300},
+                {"rank": 2, "user_id": self.bob.pk, "username": "bob", "xp": 200},
+            ],
+        )
+
+    def test_user_standing(self):
+        self.client.pipeline.return_value.execute.return_value = [1, 200.0]
+        self.client.zrevrange.return_value = [
+            (str(self.alice.pk).encode(), 300.0),
+            (str(self.bob.pk).encode(), 200.0),
+        ]
+
+        standing = leaderboard.get_user_standing(self.bob.pk, 1)
+
+        self.client.zrevrange.assert_called_once_with(
+            leaderboard.LEADERBOARD_KEY, 0, 2, withscores=True
+        )
+        self.assertEqual(standing["rank"], 2)
+        self.assertEqual(standing["xp"], 200)
+        self.assertEqual(standing["neighbours"][0]["username"], "alice")
+
+    def test_user_not_ranked(self):
+        self.client.pipeline.return_value.execute.return_value = [None, None]
+
+        self.assertIsNone(leaderboard.get_user_standing(self.bob.pk, 1))
+
+    def test_sync_xp_writes_absolute_scores(self):
+        deleted_id = self.bob.pk + 100
+
+        leaderboard.sync_xp([self.alice.pk, deleted_id])
+
+        self.client.sadd.assert_called_once_with(
+            leaderboard.CHANGED_KEY, self.alice.pk, deleted_id
+        )
+        pipeline = self.client.pipeline.return_value
+        pipeline.zadd.assert_called_once_with(
+            leaderboard.LEADERBOARD_KEY, {self.alice.pk: 300}
+        )
+        pipeline.zrem.assert_called_once_with(leaderboard.LEADERBOARD_KEY, deleted_id)
+
+    def test_rebuild_swaps_in_new_set(self):
+        self.client.pipeline.return_value.execute.return_value = [True, set(), 0]
+
+        count = leaderboard.rebuild(batch_size=1)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(self.client.zadd.call_count, 2)
+        self.client.pipeline.return_value.rename.assert_called_once_with(
+            f"{leaderboard.LEADERBOARD_KEY}:rebuild", leaderboard.LEADERBOARD_KEY
+        )
+
+    def test_rebuild_reapplies_updates_made_while_filling(self):
+        pipeline = self.client.pipeline.return_value
+        pipeline.execute.return_value = [True, {str(self.bob.pk).encode()}, 1]
+        # bob answered after the scan read his XP.
+        self.client.zadd.side_effect = lambda *args: User.objects.filter(
+            pk=self.bob.pk
+        ).update(xp=250)
+
+        leaderboard.rebuild()
+
+        self.client.zadd.assert_called_once_with(
+            f"{leaderboard.LEADERBOARD_KEY}:rebuild",
+            {self.alice.pk: 300, self.bob.pk: 200},
+        )
+        pipeline.zadd.assert_called_once_with(
+            leaderboard.LEADERBOARD_KEY, {self.bob.pk: 250}
+        )
+
+    def test_incremental_update_errors_are_swallowed(self):
+        self.client.sadd.side_effect = redis.ConnectionError()
+
+        leaderboard.sync_xp([self.alice.pk])
+
+        self.client.sadd.assert_called_once()
+
+    def test_disabled_leaderboard(self):
+        with patch("core.services.leaderboard.get_client", return_value=None):
+            leaderboard.sync_xp([self.alice.pk])
+            self.assertEqual(leaderboard.get_top(10), [])
+
+        self.client.sadd.assert_not_called()
@@ -0,0 +1,111 @@
+from unittest.mock import Mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.services.query_cache import (
+    LRUCache,
+    get_allowed_tables,
+    get_or_validate,
+    get_query_limits,
+    normalize_sql,
+    validation_cache,
+)
+from core.users.models import AvailableTable, Case
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.stats()["size"], 2)
+
+    def test_counts_hits_and_misses(self):
+        lru = LRUCache(maxsize=2)
+        lru.set("a", 1)
+        lru.get("a")
+        lru.get("missing")
+
+        stats = lru.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+
+class GetOrValidateTests(SimpleTestCase):
+    def setUp(self):
+        validation_cache.clear()
+
+    def test_normalize_sql_keeps_literals(self):
+        self.assertEqual(normalize_sql(" SELECT  1 ; "), "SELECT 1")
+        self.assertEqual(normalize_sql("SELECT  'a  b'"), "SELECT  'a  b'")
+
+    def test_repeated_query_is_validated_once(self):
+        validate = Mock(return_value="SELECT 1 LIMIT 1000")
+
+        for sql in ("SELECT 1", "SELECT  1;"):
+            self.assertEqual(
+                get_or_validate(sql, {"person"}, validate), "SELECT 1 LIMIT 1000"
+            )
+
+        validate.assert_called_once()
+        self.assertEqual(validation_cache.stats()["hits"], 1)
+
+    def test_rejection_is_cached(self):
+        validate = Mock(side_effect=ValueError("denied"))
+
+        for _ in range(2):
+            with self.assertRaisesMessage(ValueError, "denied"):
+                get_or_validate("SELECT * FROM evidence", {"person"}, validate)
+
+        validate.assert_called_once()
+
+    def test_table_set_is_part_of_the_key(self):
+        validate = Mock(return_value="SELECT 1 LIMIT 1000")
+
+        get_or_validate("SELECT 1", {"person"}, validate)
+        get_or_validate("SELECT 1", {"person", "suspect"}, validate)
+
+        self.assertEqual(validate.call_count, 2)
+
+
+class AllowedTablesCacheTests(TestCase):
+    databases = {"users"}
+
+    def setUp(self):
+        cache.clear()
+        self.case = Case.objects.create(
+            title="Case",
+            description="desc",
+            required_xp=0,
+            reward_xp=5,
+            answer="answer",
+        )
+
+    def test_invalidated_when_available_tables_change(self):
+        AvailableTable.objects.create(case=self.case, table="person")
+        self.assertEqual(get_allowed_tables(self.case.id), {"person"})
+
+        with self.captureOnCommitCallbacks(using="users", execute=True):
+            table = AvailableTable.objects.create(case=self.case, table="suspect")
+        self.assertEqual(get_allowed_tables(self.case.id), {"person", "suspect"})
+
+        with self.captureOnCommitCallbacks(using="users", execute=True):
+            table.delete()
+        self.assertEqual(get_allowed_tables(self.case.id), {"person"})
+
+    @override_settings(SQL_QUERY_LIMITS={"statement_timeout": 5000, "max_rows": 1000})
+    def test_query_limits_override_defaults(self):
+        with self.captureOnCommitCallbacks(using="users", execute=True):
+            self.case.max_rows = 10
+            self.case.save()
+
+        self.assertEqual(
+            get_query_limits(self.case.id),
+            {"statement_timeout": 5000, "max_rows": 10},
+        )
@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from core.services.result_cache import (
+    bump_dataset_version,
+    cache_result,
+    get_cached_result,
+)
+
+SQL = "SELECT id, date_birth FROM person LIMIT 1000"
+
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_round_trip(self):
+        result = {"columns": ["id", "date_birth"], "rows": [(1, date(1990, 1, 2))]}
+
+        self.assertIsNone(get_cached_result(SQL))
+        self.assertTrue(cache_result(SQL, result))
+        self.assertEqual(
+            get_cached_result(SQL),
+            {"columns": ["id", "date_birth"], "rows": [[1, "1990-01-02"]]},
+        )
+
+    def test_dataset_version_bump_invalidates(self):
+        cache_result(SQL, {"columns": ["id"], "rows": [[1]]})
+        bump_dataset_version()
+
+        self.assertIsNone(get_cached_result(SQL))
+
+    @override_settings(SQL_RESULT_CACHE_MAX_BYTES=16)
+    def test_large_results_are_not_cached(self):
+        rows = [[i, f"person {i}"] for i in range(100)]
+
+        self.assertFalse(cache_result(SQL, {"columns": ["id", "name"], "rows": rows}))
+        self.assertIsNone(get_cached_result(SQL))
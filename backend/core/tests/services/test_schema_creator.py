@@ -0,0 +1,153 @@
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.services.schema_creator import (
+    bump_schema_version,
+    get_schema,
+    get_schema_snapshot,
+    schema_cache,
+)
+from core.users.models import AvailableTable, Case
+
+SCHEMA = [{"tableName": "person", "columns": [], "foreignKeys": []}]
+
+
+class GetSchemaTests(TestCase):
+    databases = {"users", "investigations"}
+
+    def setUp(self):
+        case = Case.objects.create(
+            title="A",
+            description="A",
+            short_description="A",
+            required_xp=0,
+            reward_xp=100,
+            answer="A",
+        )
+        self.case_id = case.id
+        for table in ("suspect", "person"):
+            AvailableTable.objects.create(case=case, table=table)
+
+    def get_schema(self, rows):
+        cursor = MagicMock()
+        cursor.fetchall.return_value = rows
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value = cursor
+        with patch(
+            "core.services.schema_creator.connections",
+            {"investigations": connection},
+        ):
+            return get_schema(self.case_id), cursor
+
+    def test_single_introspection_query(self):
+        tables, cursor = self.get_schema(
+            [
+                ("person", "id", "bigint", True, None, None),
+                ("person", "name", "character varying", False, None, None),
+                ("suspect", "id", "bigint", True, None, None),
+                ("suspect", "person_id", "bigint", False, "person", "id"),
+            ]
+        )
+
+        cursor.execute.assert_called_once()
+        schema = {table["tableName"]: table for table in tables}
+        self.assertEqual(schema.keys(), {"suspect", "person"})
+        self.assertEqual(
+            schema["suspect"]["foreignKeys"],
+            [{"fromColumn": "person_id", "toTable": "person", "toColumn": "id"}],
+        )
+        self.assertEqual(
+            schema["person"]["columns"][1],
+            {
+                "name": "name",
+                "type": "character varying",
+                "isPrimary": False,
+                "isForeign": False,
+                "help_text": "ФИO человека.",
+            },
+        )
+        self.assertTrue(schema["suspect"]["columns"][1]["isForeign"])
+        self.assertEqual(
+            schema["suspect"]["columns"][1]["help_text"],
+            "человек, связанный с этим подозреваемым.",
+        )
+
+    def test_column_with_several_foreign_keys(self):
+        tables, _ = self.get_schema(
+            [
+                ("suspect", "person_id", "bigint", False, "person", "id"),
+                ("suspect", "person_id", "bigint", False, "person", "uid"),
+            ]
+        )
+
+        suspect = next(table for table in tables if table["tableName"] == "suspect")
+        self.assertEqual(len(suspect["columns"]), 1)
+        self.assertEqual(len(suspect["foreignKeys"]), 2)
+
+
+class SchemaSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        schema_cache.clear()
+        self.allowed_tables = frozenset({"person"})
+        patcher = patch(
+            "core.services.schema_creator.get_allowed_tables",
+            side_effect=lambda case_id: self.allowed_tables,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def snapshot(self):
+        with patch(
+            "core.services.schema_creator.get_schema", return_value=SCHEMA
+        ) as get_schema:
+            return get_schema_snapshot(1), get_schema
+
+    def test_snapshot_is_built_once(self):
+        first, _ = self.snapshot()
+        second, get_schema = self.snapshot()
+
+        self.assertEqual(second, first)
+        self.assertEqual(first["schema"], SCHEMA)
+        get_schema.assert_not_called()
+
+    def test_shared_cache_is_used_by_other_processes(self):
+        first, _ = self.snapshot()
+        schema_cache.clear()
+
+        second, get_schema = self.snapshot()
+
+        self.assertEqual(second["etag"], first["etag"])
+        get_schema.assert_not_called()
+
+    def test_version_bump_rebuilds(self):
+        self.snapshot()
+        bump_schema_version()
+
+        _, get_schema = self.snapshot()
+
+        get_schema.assert_called_once_with(1)
+
+    @override_settings(SQL_SCHEMA_CACHE_TIMEOUT=123)
+    def test_shared_snapshot_expires(self):
+        with patch.object(cache, "set", wraps=cache.set) as cache_set:
+            self.snapshot()
+
+        self.assertEqual(cache_set.call_args.kwargs["timeout"], 123)
+
+    def test_changed_tables_rebuild(self):
+        self.snapshot()
+        self.allowed_tables = frozenset({"person", "suspect"})
+
+        _, get_schema = self.snapshot()
+
+        get_schema.assert_called_once_with(1)
+
+    def test_case_without_tables(self):
+        self.allowed_tables = frozenset()
+
+        with self.assertRaises(ObjectDoesNotExist):
+            get_schema_snapshot(1)
@@ -0,0 +1,500 @@
+import time
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from psycopg2 import OperationalError
+from psycopg2.errors import QueryCanceled
+
+from core.services.sql_executor import (
+    AdmittedQuery,
+    QueryLimitExceeded,
+    QueryTimeout,
+    check_query_cost,
+    execute_with_limits,
+    explain_query,
+    is_pageable,
+    make_page_token,
+    page_query,
+    run_inline,
+    run_validated_sql_query,
+    validate_and_prepare_query,
+)
+
+ALLOWED_TABLES = {"person", "suspect"}
+
+
+class ValidateAndPrepareQueryTests(SimpleTestCase):
+    def test_select_gets_default_limit(self):
+        sql = validate_and_prepare_query("SELECT name FROM person;", ALLOWED_TABLES)
+        self.assertEqual(sql, "SELECT name FROM person LIMIT 1000")
+
+    def test_existing_limit_is_kept(self):
+        sql = validate_and_prepare_query(
+            "SELECT name FROM person LIMIT 5", ALLOWED_TABLES
+        )
+        self.assertEqual(sql, "SELECT name FROM person LIMIT 5")
+
+    def test_comments_are_stripped(self):
+        sql = validate_and_prepare_query(
+            "SELECT name FROM person -- comment", ALLOWED_TABLES
+        )
+        self.assertNotIn("comment", sql)
+
+    def test_cte_names_are_not_tables(self):
+        sql = validate_and_prepare_query(
+            "WITH s AS (SELECT person_id FROM suspect) SELECT * FROM s",
+            ALLOWED_TABLES,
+        )
+        self.assertTrue(sql.endswith("LIMIT 1000"))
+
+    def test_cte_of_subquery_does_not_shadow_outer_table(self):
+        with self.assertRaisesMessage(ValueError, "'evidence'"):
+            validate_and_prepare_query(
+                "SELECT * FROM (WITH evidence AS (SELECT 1) SELECT * FROM evidence) a, "
+                "evidence",
+                ALLOWED_TABLES,
+            )
+
+    def test_cte_body_does_not_see_its_own_name(self):
+        with self.assertRaisesMessage(ValueError, "'evidence'"):
+            validate_and_prepare_query(
+                "WITH evidence AS (SELECT * FROM evidence) SELECT * FROM evidence",
+                ALLOWED_TABLES,
+            )
+
+    def test_cte_is_visible_in_later_ctes_and_subqueries(self):
+        sql = validate_and_prepare_query(
+            "WITH a AS (SELECT person_id FROM suspect), b AS (SELECT * FROM a) "
+            "SELECT * FROM (SELECT * FROM b) x WHERE person_id IN (SELECT * FROM a)",
+            ALLOWED_TABLES,
+        )
+        self.assertTrue(sql.endswith("LIMIT 1000"))
+
+    def test_empty_query(self):
+        with self.assertRaisesMessage(ValueError, "Пустой"):
+            validate_and_prepare_query("   ", ALLOWED_TABLES)
+
+    def test_non_select_rejected(self):
+        with self.assertRaisesMessage(ValueError, "Разрешён только SELECT"):
+            validate_and_prepare_query("DELETE FROM person", ALLOWED_TABLES)
+
+    def test_multiple_statements_rejected(self):
+        with self.assertRaisesMessage(ValueError, "запрещённые конструкции"):
+            validate_and_prepare_query("SELECT 1; DROP TABLE person", ALLOWED_TABLES)
+
+    def test_nested_dml_rejected(self):
+        with self.assertRaisesMessage(ValueError, "запрещённые SQL-операции"):
+            validate_and_prepare_query(
+                "WITH d AS (DELETE FROM person RETURNING *) SELECT * FROM d",
+                ALLOWED_TABLES,
+            )
+
+    def test_select_into_rejected(self):
+        with self.assertRaisesMessage(ValueError, "запрещённые конструкции"):
+            validate_and_prepare_query("SELECT * INTO copy FROM person", ALLOWED_TABLES)
+
+    def test_recursive_rejected(self):
+        with self.assertRaisesMessage(ValueError, "запрещённые конструкции"):
+            validate_and_prepare_query(
+                "WITH RECURSIVE r AS (SELECT 1) SELECT * FROM r", ALLOWED_TABLES
+            )
+
+    def assert_function_rejected(self, sql, name):
+        with self.assertRaisesMessage(ValueError, f"'{name}'"):
+            validate_and_prepare_query(sql, ALLOWED_TABLES)
+
+    def test_set_config_rejected(self):
+        self.assert_function_rejected(
+            "SELECT set_config('statement_timeout', '0', true), * FROM person",
+            "set_config",
+        )
+
+    def test_qualified_set_config_rejected(self):
+        self.assert_function_rejected(
+            "SELECT pg_catalog.set_config('work_mem', '1GB', true)", "set_config"
+        )
+
+    def test_current_setting_rejected(self):
+        self.assert_function_rejected(
+            "SELECT current_setting('statement_timeout')", "current_setting"
+        )
+
+    def test_pg_sleep_rejected(self):
+        self.assert_function_rejected("SELECT PG_SLEEP(10)", "PG_SLEEP")
+
+    def test_pg_sleep_for_rejected(self):
+        self.assert_function_rejected(
+            "SELECT * FROM person WHERE pg_sleep_for('10 s') IS NULL",
+            "pg_sleep_for",
+        )
+
+    def test_dblink_rejected(self):
+        self.assert_function_rejected(
+            "SELECT * FROM dblink('host=db', 'SELECT 1') AS t(x int)", "dblink"
+        )
+
+    def test_dblink_exec_rejected(self):
+        self.assert_function_rejected(
+            "SELECT dblink_exec('host=db', 'DROP TABLE person')", "dblink_exec"
+        )
+
+    def test_lo_import_rejected(self):
+        self.assert_function_rejected("SELECT lo_import('/etc/passwd')", "lo_import")
+
+    def test_lo_get_rejected(self):
+        self.assert_function_rejected("SELECT lo_get(16384)", "lo_get")
+
+    def test_loread_rejected(self):
+        self.assert_function_rejected("SELECT loread(0, 100)", "loread")
+
+    def test_pg_read_file_rejected(self):
+        self.assert_function_rejected(
+            "SELECT pg_read_file('postgresql.conf')", "pg_read_file"
+        )
+
+    def test_pg_read_binary_file_rejected(self):
+        self.assert_function_rejected(
+            "SELECT pg_read_binary_file('postgresql.conf')", "pg_read_binary_file"
+        )
+
+    def test_pg_ls_dir_rejected(self):
+        self.assert_function_rejected("SELECT pg_ls_dir('.')", "pg_ls_dir")
+
+    def test_pg_terminate_backend_rejected(self):
+        self.assert_function_rejected(
+            "SELECT pg_terminate_backend(1)", "pg_terminate_backend"
+        )
+
+    def test_pg_advisory_lock_rejected(self):
+        self.assert_function_rejected("SELECT pg_advisory_lock(1)", "pg_advisory_lock")
+
+    def test_query_to_xml_rejected(self):
+        self.assert_function_rejected(
+            "SELECT query_to_xml('SELECT * FROM evidence', true, true, '')",
+            "query_to_xml",
+        )
+
+    def test_function_in_subquery_rejected(self):
+        self.assert_function_rejected(
+            "SELECT * FROM person WHERE id IN (SELECT pg_sleep(1))", "pg_sleep"
+        )
+
+    def test_ordinary_functions_allowed(self):
+        sql = validate_and_prepare_query(
+            "SELECT upper(name), length(name), now() FROM person", ALLOWED_TABLES
+        )
+        self.assertTrue(sql.endswith("LIMIT 1000"))
+
+    def test_table_not_allowed(self):
+        with self.assertRaisesMessage(ValueError, "'evidence'"):
+            validate_and_prepare_query("SELECT * FROM evidence", ALLOWED_TABLES)
+
+    @override_settings(SQL_MAX_LIMIT=100)
+    def test_limits_are_clamped(self):
+        sql = validate_and_prepare_query(
+            "SELECT * FROM person WHERE id IN "
+            "(SELECT person_id FROM suspect LIMIT ALL) LIMIT 100000000",
+            ALLOWED_TABLES,
+        )
+        self.assertEqual(
+            sql,
+            "SELECT * FROM person WHERE id IN "
+            "(SELECT person_id FROM suspect LIMIT 100) LIMIT 100",
+        )
+
+    @override_settings(SQL_MAX_LIMIT=100)
+    def test_fetch_first_is_clamped(self):
+        sql = validate_and_prepare_query(
+            "SELECT * FROM person FETCH FIRST 5000 ROWS ONLY", ALLOWED_TABLES
+        )
+        self.assertEqual(sql, "SELECT * FROM person FETCH FIRST 100 ROWS ONLY")
+
+    def test_foreign_schema_rejected(self):
+        with self.assertRaisesMessage(ValueError, "pg_catalog.person"):
+            validate_and_prepare_query(
+                "SELECT * FROM pg_catalog.person", ALLOWED_TABLES
+            )
+
+
+class ExecuteWithLimitsTests(SimpleTestCase):
+    limits = {
+        "statement_timeout": 1000,
+        "work_mem": 1024,
+        "max_rows": 3,
+        "max_bytes": 1024,
+    }
+
+    def setUp(self):
+        self.cursor = MagicMock()
+        self.named_cursor = MagicMock()
+        self.named_cursor.description = [("id",), ("name",)]
+        self.connection = connection = MagicMock()
+        connection.cursor.side_effect = lambda name=None: MagicMock(
+            **{"__enter__.return_value": self.named_cursor if name else self.cursor}
+        )
+        self.pool = pool = MagicMock()
+        pool.connection.return_value.__enter__.return_value = connection
+        patcher = patch("core.services.sql_executor.get_player_pool", return_value=pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def execute(self, rows, limits=None):
+        batches = iter([rows, []])
+        self.named_cursor.fetchmany.side_effect = lambda size: next(batches, [])[:size]
+        return execute_with_limits("SELECT 1", limits or self.limits, 0, 500)
+
+    def test_sets_local_limits(self):
+        result = self.execute([(1, "a")])
+
+        self.assertEqual(
+            result,
+            {
+                "columns": ["id", "name"],
+                "rows": [(1, "a")],
+                "truncated": False,
+                "total": 1,
+                "offset": 0,
+            },
+        )
+        self.assertEqual(self.cursor.execute.call_args.args[1], ["1000", "1024kB"])
+
+    def test_rows_are_truncated_at_cap(self):
+        result = self.execute([(i, "a") for i in range(10)])
+
+        self.assertEqual(len(result["rows"]), 3)
+        self.assertTrue(result["truncated"])
+        self.assertEqual(result["total"], 500)
+        self.named_cursor.fetchmany.assert_called_once_with(4)
+
+    def test_byte_budget(self):
+        with self.assertRaisesMessage(QueryLimitExceeded, "64 байт"):
+            self.execute([(1, "a" * 100)], {**self.limits, "max_bytes": 64})
+
+    def test_statement_timeout(self):
+        self.named_cursor.fetchmany.side_effect = QueryCanceled()
+
+        with self.assertRaisesMessage(QueryLimitExceeded, "1000 мс"):
+            execute_with_limits("SELECT 1", self.limits)
+
+    def test_timeout_covers_all_fetches(self):
+        # Each FETCH stays under the server timeout, the query as a whole
+        # does not: 0.3 s per batch against a 1 s budget.
+        clock = iter([0, 0, 0, 0.3, 0.6, 0.9, 1.2])
+        self.named_cursor.fetchmany.side_effect = lambda size: [(1, "a")] * size
+        limits = {**self.limits, "max_rows": 1000, "max_bytes": 10**6}
+
+        with (
+            patch(
+                "core.services.sql_executor.time.monotonic",
+                side_effect=lambda: next(clock),
+            ),
+            patch("core.services.sql_executor.threading.Timer") as timer,
+            self.assertRaisesMessage(QueryTimeout, "1000 мс"),
+        ):
+            execute_with_limits("SELECT 1", limits)
+
+        self.assertEqual(self.named_cursor.fetchmany.call_count, 3)
+        timer.return_value.cancel.assert_called_once()
+
+    def test_deadline_includes_checkout(self):
+        with patch("core.services.sql_executor.time.monotonic", side_effect=[10.25]):
+            with self.assertRaisesMessage(QueryTimeout, "1000 мс"):
+                execute_with_limits("SELECT 1", self.limits, deadline=10.2)
+
+        self.pool.connection.assert_called_once_with(0)
+        self.cursor.execute.assert_not_called()
+
+    def test_deadline_tightens_statement_timeout(self):
+        batches = iter([[(1, "a")]])
+        self.named_cursor.fetchmany.side_effect = lambda size: next(batches, [])
+
+        with patch("core.services.sql_executor.threading.Timer"):
+            execute_with_limits(
+                "SELECT 1", self.limits, deadline=time.monotonic() + 0.2
+            )
+
+        self.assertLessEqual(int(self.cursor.execute.call_args.args[1][0]), 200)
+
+    def test_query_is_cancelled_at_deadline(self):
+        with patch("core.services.sql_executor.threading.Timer") as timer:
+            self.execute([(1, "a")])
+
+        delay, cancel = timer.call_args.args
+        self.assertAlmostEqual(delay, 1, places=1)
+        self.assertEqual(cancel, self.connection.cancel)
+
+
+class QueryCostTests(SimpleTestCase):
+    limits = {"max_cost": 1000, "max_plan_rows": 100}
+
+    def setUp(self):
+        cache.clear()
+        self.cursor = MagicMock()
+        self.cursor.fetchone.return_value = [
+            [{"Plan": {"Total Cost": 12.5, "Plan Rows": 40}}]
+        ]
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value = self.cursor
+        pool = MagicMock()
+        pool.connection.return_value.__enter__.return_value = connection
+        patcher = patch("core.services.sql_executor.get_player_pool", return_value=pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_plan_is_cached(self):
+        self.assertEqual(
+            explain_query("SELECT 1"), {"total_cost": 12.5, "plan_rows": 40}
+        )
+        explain_query("SELECT 1")
+
+        self.cursor.execute.assert_called_once_with("EXPLAIN (FORMAT JSON) SELECT 1")
+
+    def test_cheap_query_is_admitted(self):
+        check_query_cost({"total_cost": 12.5, "plan_rows": 40}, self.limits)
+
+    def test_expensive_query_is_rejected(self):
+        with self.assertRaisesMessage(QueryLimitExceeded, "1000"):
+            check_query_cost({"total_cost": 5e6, "plan_rows": 40}, self.limits)
+
+    def test_large_result_is_rejected(self):
+        with self.assertRaisesMessage(QueryLimitExceeded, "100"):
+            check_query_cost({"total_cost": 12.5, "plan_rows": 10**6}, self.limits)
+
+
+class PageQueryTests(SimpleTestCase):
+    def test_ordered_query_is_cut_by_its_own_limit_and_offset(self):
+        self.assertEqual(
+            page_query("SELECT id FROM person ORDER BY id LIMIT 1000", 20, 10),
+            "SELECT id FROM person ORDER BY id LIMIT 11 OFFSET 20",
+        )
+
+    def test_page_stays_within_the_player_limit_and_offset(self):
+        self.assertEqual(
+            page_query("SELECT id FROM person ORDER BY id LIMIT 25 OFFSET 5", 20, 10),
+            "SELECT id FROM person ORDER BY id LIMIT 5 OFFSET 25",
+        )
+
+    def test_unordered_query_has_only_a_first_page(self):
+        sql = "SELECT id FROM person LIMIT 1000"
+
+        self.assertFalse(is_pageable(sql))
+        self.assertEqual(
+            page_query(sql, 0, 10), f"SELECT * FROM ({sql}) AS page LIMIT 11"
+        )
+        with self.assertRaisesMessage(ValueError, "ORDER BY"):
+            page_query(sql, 10, 10)
+
+    def test_fetch_with_ties_is_not_pageable(self):
+        self.assertFalse(
+            is_pageable(
+                "SELECT id FROM person ORDER BY id FETCH FIRST 5 ROWS WITH TIES"
+            )
+        )
+
+
+class RunValidatedSqlQueryTests(SimpleTestCase):
+    limits = {"max_rows": 2, "max_cost": 1000, "max_plan_rows": 100}
+    plan = {"total_cost": 10, "plan_rows": 50}
+
+    def setUp(self):
+        cache.clear()
+        for name, value in (
+            ("get_allowed_tables", {"person"}),
+            ("get_query_limits", self.limits),
+            ("explain_query", self.plan),
+        ):
+            patcher = patch(f"core.services.sql_executor.{name}", return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_page(self, page_token=None, truncated=True, sql="SELECT id FROM person"):
+        page = {"columns": ["id"], "rows": [[1], [2]], "truncated": truncated}
+        with patch(
+            "core.services.sql_executor.execute_with_limits", return_value=page
+        ) as execute:
+            result = run_validated_sql_query(1, 7, sql, page_token=page_token)
+        return result, execute
+
+    def test_next_page_token(self):
+        result, _ = self.run_page(sql="SELECT id FROM person ORDER BY id")
+        _, execute = self.run_page(result["next_page"])
+
+        execute.assert_called_once_with(
+            "SELECT id FROM person ORDER BY id LIMIT 1000", self.limits, 2, 50, None
+        )
+
+    def test_unordered_query_has_no_token(self):
+        result, _ = self.run_page()
+
+        self.assertTrue(result["truncated"])
+        self.assertIsNone(result["next_page"])
+
+    def test_last_page_has_no_token(self):
+        result, _ = self.run_page(truncated=False)
+
+        self.assertIsNone(result["next_page"])
+
+    def test_token_is_bound_to_case(self):
+        token = make_page_token(8, "SELECT id FROM person LIMIT 1000", 2)
+
+        result, execute = self.run_page(token)
+
+        self.assertIn("error", result)
+        execute.assert_not_called()
+
+    def test_expensive_query_is_not_executed(self):
+        with patch(
+            "core.services.sql_executor.explain_query",
+            return_value={"total_cost": 10**6, "plan_rows": 50},
+        ):
+            result, execute = self.run_page()
+
+        self.assertIn("Запрос слишком тяжёлый", result["error"])
+        execute.assert_not_called()
+
+
+@override_settings(SQL_INLINE_MAX_COST=100, SQL_INLINE_STATEMENT_TIMEOUT=200)
+class RunInlineTests(SimpleTestCase):
+    limits = {"statement_timeout": 5000, "max_rows": 10}
+
+    def setUp(self):
+        cache.clear()
+
+    def run_inline(self, cost=10, **execute_kwargs):
+        query = AdmittedQuery(
+            "SELECT 1", 0, self.limits, {"total_cost": cost, "plan_rows": 1}
+        )
+        with patch(
+            "core.services.sql_executor.execute_with_limits", **execute_kwargs
+        ) as execute:
+            return run_inline(7, query), execute
+
+    def test_cheap_query_runs_with_tight_timeout(self):
+        page = {"columns": ["?column?"], "rows": [[1]], "truncated": False}
+
+        result, execute = self.run_inline(return_value=page)
+
+        self.assertEqual(result["rows"], [[1]])
+        self.assertEqual(execute.call_args.args[1]["statement_timeout"], 200)
+        self.assertLessEqual(execute.call_args.args[4], time.monotonic() + 0.2)
+
+    def test_expensive_query_is_deferred(self):
+        result, execute = self.run_inline(cost=1000)
+
+        self.assertIsNone(result)
+        execute.assert_not_called()
+
+    def test_timeout_is_deferred(self):
+        result, _ = self.run_inline(side_effect=QueryTimeout("200 мс"))
+
+        self.assertIsNone(result)
+
+    def test_other_errors_are_returned(self):
+        result, _ = self.run_inline(side_effect=QueryLimitExceeded("64 байт"))
+
+        self.assertEqual(result, {"error": "64 байт"})
+
+    def test_connection_errors_are_raised(self):
+        with self.assertRaises(OperationalError):
+            self.run_inline(side_effect=OperationalError("connection refused"))
@@ -1,5 +1,10 @@
-from django.test import TransactionTestCase
+from unittest.mock import patch
 
+from django.db.models.signals import post_delete
+from django.test import TransactionTestCase, override_settings
+
+from core.services.resource_versions import get_resource_versions, user_progress
+from core.services.user_progress import create_progress_for_case
 from core.users.models import Case, User, UserProgress
 
 
@@ -47,6 +52,61 @@ class UsersSignalTests(TransactionTestCase):
         )
         self.assertTrue(progress_exists)
 
+    def test_case_progress_fan_out_keeps_existing_rows(self):
+        case = Case.objects.using("users").create(
+            title="C",
+            description="C",
+            short_description="C",
+            reward_xp=100,
+            answer="C",
+            required_xp=0,
+        )
+        UserProgress.objects.using("users").filter(case=case).update(
+            status="завершено"
+        )
+
+        create_progress_for_case(case.pk)
+
+        self.assertEqual(
+            list(
+                UserProgress.objects.using("users")
+                .filter(case=case)
+                .values_list("status", flat=True)
+            ),
+            ["завершено"],
+        )
+
+    @override_settings(USER_PROGRESS_ASYNC_FAN_OUT_MIN_USERS=1)
+    def test_large_case_progress_fan_out_is_deferred(self):
+        with patch("core.users.signals.create_case_progress.delay") as mock_task:
+            case = Case.objects.using("users").create(
+                title="D",
+                description="D",
+                short_description="D",
+                reward_xp=100,
+                answer="D",
+                required_xp=0,
+            )
+
+        mock_task.assert_called_once_with(case.pk)
+        self.assertFalse(
+            UserProgress.objects.using("users").filter(case=case).exists()
+        )
+
+    @override_settings(USER_PROGRESS_LAZY=True)
+    def test_lazy_progress_skips_fan_out(self):
+        case = Case.objects.using("users").create(
+            title="F",
+            description="F",
+            short_description="F",
+            reward_xp=100,
+            answer="F",
+            required_xp=0,
+        )
+        User.objects.create_user(username="test3", password="12345678")
+
+        self.assertFalse(UserProgress.objects.using("users").filter(case=case).exists())
+
     def test_deduct_xp_on_case_deletion(self):
         case = Case.objects.using("users").create(
             title="E",
@@ -71,3 +131,16 @@ class UsersSignalTests(TransactionTestCase):
 
         self.user.refresh_from_db(using="users")
         self.assertEqual(self.user.xp, 0)
+
+    def test_progress_rows_are_fast_deleted(self):
+        # A post_delete receiver would make Django fetch and signal each row.
+        self.assertFalse(post_delete.has_listeners(UserProgress))
+
+    def test_user_deletion_bumps_progress_version(self):
+        resource = user_progress(self.user.pk)
+        [before] = get_resource_versions(resource)
+
+        self.user.delete()
+
+        [after] = get_resource_versions(resource)
+        self.assertGreater(after, before)
@@ -1,9 +1,15 @@
 from unittest.mock import MagicMock, patch
 
+from celery.exceptions import TimeoutError as TaskTimeoutError
+from django.test import override_settings
 from django.urls import reverse
+from django.utils.http import http_date
+from psycopg2 import OperationalError
+from psycopg2.errors import QueryCanceled
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
+from core.services.sql_executor import QueryLimitExceeded
 from core.users.models import Case, User, UserProgress
 
 
@@ -31,20 +37,155 @@ class UsersViewTests(APITestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # type: ignore
-        self.assertEqual(response.data[0]["id"], self.case.id)  # type: ignore
+        self.assertEqual(response.data["count"], 1)  # type: ignore
+        self.assertEqual(
+            response.data["results"],  # type: ignore
+            [
+                {
+                    "id": self.case.id,
+                    "title": "A",
+                    "short_description": "A",
+                    "required_xp": 0,
+                    "reward_xp": 100,
+                    "status": "не начато",
+                }
+            ],
+        )
+
+    def test_case_list_fields(self):
+        UserProgress.objects.filter(user=self.user).update(status="завершено")
+        url = reverse("case_list")
+
+        with self.assertNumQueries(2, using="users"):
+            response = self.client.get(url, {"fields": "id,description,status"})
+
+        self.assertEqual(
+            response.data["results"],  # type: ignore
+            [{"id": self.case.id, "description": "A", "status": "завершено"}],
+        )
+
+    def test_case_list_never_sends_answer(self):
+        url = reverse("case_list")
+        response = self.client.get(url, {"fields": "id,answer"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_case_list_not_modified(self):
+        url = reverse("case_list")
+        response = self.client.get(url)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_case_list_not_modified_etag_list(self):
+        url = reverse("case_list")
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"stale", W/{etag}')
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_case_list_not_modified_any_etag(self):
+        url = reverse("case_list")
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH="*")
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_case_list_modified_etag_list(self):
+        url = reverse("case_list")
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"stale", W/"older"')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_case_list_changes_after_case_update(self):
+        url = reverse("case_list")
+        etag = self.client.get(url)["ETag"]
+
+        self.case.title = "B"
+        with self.captureOnCommitCallbacks(execute=True, using="users"):
+            self.case.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_user_progress_changes_after_answer(self):
+        url = reverse("user_progress")
+        etag = self.client.get(url)["ETag"]
+
+        progress = UserProgress.objects.get(user=self.user, case=self.case)
+        progress.status = "в процессе"
+        with self.captureOnCommitCallbacks(execute=True, using="users"):
+            progress.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["status"], "в процессе")  # type: ignore
+
+    def get_progress_at(self, version, now, **headers):
+        with (
+            patch("core.users.views.get_resource_versions", return_value=[version]),
+            patch("core.users.views.time.time_ns", return_value=now),
+        ):
+            return self.client.get(reverse("user_progress"), **headers)
+
+    def test_user_progress_if_modified_since(self):
+        changed = 1_700_000_000_100_000_000
+        last_modified = self.get_progress_at(changed, changed + 2 * 10**9)[
+            "Last-Modified"
+        ]
+
+        response = self.get_progress_at(
+            changed, changed + 3 * 10**9, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+
+        self.assertEqual(last_modified, http_date(1_700_000_001))
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_user_progress_change_within_the_same_second(self):
+        first = 1_700_000_000_100_000_000
+        second = first + 300_000_000
+
+        response = self.get_progress_at(first, first + 100_000_000)
+        self.assertNotIn("Last-Modified", response)
+
+        # A date truncated to the second of both changes must not hide the
+        # second one.
+        response = self.get_progress_at(
+            second,
+            second + 100_000_000,
+            HTTP_IF_MODIFIED_SINCE=http_date(1_700_000_000),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
 
     def test_schema_view_success(self):
-        with patch("core.users.views.get_schema") as mock_schema:
-            mock_schema.return_value = {"tables": ["person", "evidence"]}
+        with patch("core.users.views.get_schema_snapshot") as mock_schema:
+            mock_schema.return_value = {
+                "etag": "abc",
+                "schema": {"tables": ["person", "evidence"]},
+            }
             url = reverse("case_schema", args=[self.case.id])  # type: ignore
             response = self.client.get(url)
 
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertEqual(response.data["tables"], ["person", "evidence"])  # type: ignore
+            self.assertEqual(response["ETag"], '"abc"')
+
+    def test_schema_view_not_modified(self):
+        with patch("core.users.views.get_schema_snapshot") as mock_schema:
+            mock_schema.return_value = {"etag": "abc", "schema": []}
+            url = reverse("case_schema", args=[self.case.id])  # type: ignore
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"abc"')
+
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
 
     def test_schema_view_not_found(self):
-        with patch("core.users.views.get_schema", side_effect=Exception("not found")):
+        with patch(
+            "core.users.views.get_schema_snapshot", side_effect=Exception("not found")
+        ):
             url = reverse("case_schema", args=[self.case.id])  # type: ignore
             response = self.client.get(url)
 
@@ -56,13 +197,95 @@ class UsersViewTests(APITestCase):
     def test_execute_sql_view_success(self):
         url = reverse("execute_sql", args=[self.case.id])  # type: ignore
 
-        with patch("core.users.views.execute_safe_sql.delay") as mock_task:
+        with (
+            patch("core.users.views.admit_query"),
+            patch("core.users.views.run_inline", return_value=None),
+            patch("core.users.views.execute_safe_sql.delay") as mock_task,
+        ):
             mock_task.return_value.id = "id"
             response = self.client.post(url, data={"sql": "SELECT 1"})
 
         self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
         self.assertEqual(response.data["task_id"], "id")  # type: ignore
 
+    def test_execute_sql_view_access_check_is_cached(self):
+        url = reverse("execute_sql", args=[self.case.id])  # type: ignore
+
+        with (
+            patch("core.users.views.admit_query"),
+            patch("core.users.views.run_inline", return_value={"rows": []}),
+        ):
+            self.client.post(url, data={"sql": "SELECT 1"})
+            with self.assertNumQueries(1, using="users"):
+                self.client.post(url, data={"sql": "SELECT 1"})
+
+    def test_execute_sql_view_inline(self):
+        url = reverse("execute_sql", args=[self.case.id])  # type: ignore
+        result = {"columns": ["?column?"], "rows": [[1]], "truncated": False}
+
+        with (
+            patch("core.users.views.admit_query"),
+            patch("core.users.views.run_inline", return_value=result),
+            patch("core.users.views.execute_safe_sql.delay") as mock_task,
+        ):
+            response = self.client.post(url, data={"sql": "SELECT 1"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"status": "SUCCESS", "result": result})  # type: ignore
+        mock_task.assert_not_called()
+
+    def test_execute_sql_view_rejects_expensive_query(self):
+        url = reverse("execute_sql", args=[self.case.id])  # type: ignore
+
+        with (
+            patch(
+                "core.users.views.admit_query",
+                side_effect=QueryLimitExceeded("Запрос слишком тяжёлый"),
+            ),
+            patch("core.users.views.execute_safe_sql.delay") as mock_task,
+        ):
+            response = self.client.post(url, data={"sql": "SELECT 1"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Запрос слишком тяжёлый", response.data["error"])  # type: ignore
+        mock_task.assert_not_called()
+
+    @override_settings(SQL_RETRY_AFTER=5)
+    def test_execute_sql_view_database_unavailable(self):
+        url = reverse("execute_sql", args=[self.case.id])  # type: ignore
+
+        with patch(
+            "core.users.views.admit_query",
+            side_effect=OperationalError("connection refused"),
+        ):
+            response = self.client.post(url, data={"sql": "SELECT 1"})
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "5")
+
+    def test_execute_sql_view_inline_database_unavailable(self):
+        url = reverse("execute_sql", args=[self.case.id])  # type: ignore
+
+        with (
+            patch("core.users.views.admit_query"),
+            patch(
+                "core.users.views.run_inline",
+                side_effect=OperationalError("server closed the connection"),
+            ),
+        ):
+            response = self.client.post(url, data={"sql": "SELECT 1"})
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn("Retry-After", response)
+
+    def test_execute_sql_view_statement_timeout_is_user_error(self):
+        url = reverse("execute_sql", args=[self.case.id])  # type: ignore
+
+        with patch("core.users.views.admit_query", side_effect=QueryCanceled()):
+            response = self.client.post(url, data={"sql": "SELECT 1"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_execute_sql_view_no_sql(self):
         url = reverse("execute_sql", args=[self.case.id])  # type: ignore
         response = self.client.post(url, data={"sql": ""})
@@ -105,6 +328,32 @@ class UsersViewTests(APITestCase):
             self.assertEqual(response.data["status"], "FAILURE")  # type: ignore
             self.assertIn("error", response.data)  # type: ignore
 
+    def test_task_status_view_long_poll(self):
+        with patch("core.users.views.AsyncResult") as mock_async_result:
+            mock_result = mock_async_result.return_value
+            mock_result.ready.return_value = False
+            mock_result.status = "SUCCESS"
+            mock_result.result = {"columns": [], "rows": []}
+
+            url = reverse("task_status", args=["id"])
+            response = self.client.get(url, {"wait": "600"})
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["status"], "SUCCESS")  # type: ignore
+            mock_result.get.assert_called_once_with(timeout=25, propagate=False)
+
+    def test_task_status_view_long_poll_timeout(self):
+        with patch("core.users.views.AsyncResult") as mock_async_result:
+            mock_result = mock_async_result.return_value
+            mock_result.ready.return_value = False
+            mock_result.get.side_effect = TaskTimeoutError()
+            mock_result.status = "STARTED"
+
+            url = reverse("task_status", args=["id"])
+            response = self.client.get(url, {"wait": "1"})
+
+            self.assertEqual(response.data, {"status": "STARTED"})  # type: ignore
+
     def test_submit_answer_correct(self):
         with patch("core.users.views.check_answer", return_value=True):
             url = reverse("submit_answer", args=[self.case.id])  # type: ignore
@@ -129,6 +378,59 @@ class UsersViewTests(APITestCase):
         self.assertEqual(response.data[0]["case_id"], self.case.id)  # type: ignore
         self.assertEqual(response.data[0]["status"], "не начато")  # type: ignore
 
+    @override_settings(USER_PROGRESS_LAZY=True)
+    def test_get_user_progress_without_rows(self):
+        UserProgress.objects.all().delete()
+        url = reverse("user_progress")
+        response = self.client.get(url)
+
+        self.assertEqual(
+            response.data,  # type: ignore
+            [{"case_id": self.case.id, "status": "не начато"}],
+        )
+
+    @override_settings(USER_PROGRESS_LAZY=True)
+    def test_execute_sql_view_lazy_progress_writes_nothing(self):
+        UserProgress.objects.all().delete()
+        url = reverse("execute_sql", args=[self.case.id])  # type: ignore
+
+        with (
+            patch("core.users.views.admit_query"),
+            patch("core.users.views.run_inline", return_value={"rows": []}),
+        ):
+            response = self.client.post(url, data={"sql": "SELECT 1"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(UserProgress.objects.exists())
+
+    def test_leaderboard(self):
+        with (
+            patch("core.users.views.leaderboard.get_top", return_value=[]) as top,
+            patch(
+                "core.users.views.leaderboard.get_user_standing", return_value=None
+            ) as standing,
+        ):
+            response = self.client.get(reverse("leaderboard"), {"limit": "1000"})
+
+        self.assertEqual(response.data, {"top": [], "me": None})  # type: ignore
+        top.assert_called_once_with(100)
+        standing.assert_called_once_with(self.user.id, 2)
+
+    def test_player_pool_stats_for_admin(self):
+        self.user.is_staff = True
+        self.user.save()
+        stats = {"in_use": 1, "max_size": 4}
+
+        with patch("core.users.views.get_player_pool_stats", return_value=stats):
+            response = self.client.get(reverse("player_pool_stats"))
+
+        self.assertEqual(response.data, {"player_pool": stats})  # type: ignore
+
+    def test_player_pool_stats_forbidden_for_players(self):
+        response = self.client.get(reverse("player_pool_stats"))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_get_user_progress_unauthorized(self):
         self.client.force_authenticate(user=None)  # type: ignore
         url = reverse("user_progress")
@@ -3,6 +3,7 @@ from functools import wraps
 from rest_framework import status
 from rest_framework.response import Response
 
+from core.services.access_cache import get_case, get_user_xp
 from core.users.models import Case, User
 
 
@@ -27,15 +28,14 @@ def validate_case_access(view_func):
             )
 
         try:
-            case = Case.objects.get(pk=case_id)
+            case = get_case(case_id)
         except Case.DoesNotExist:
             return Response(
                 {"error": "Дело не найдено"}, status=status.HTTP_404_NOT_FOUND
             )
 
         try:
-            user_xp = User.objects.get(id=request.user.id)
-            if user_xp.xp < case.required_xp:
+            if get_user_xp(request.user.id) < case.required_xp:
                 return Response(
                     {"error": "Недостаточно опыта для доступа к делу"},
                     status=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,81 @@
+import time
+
+from core.management.benchmark import rolled_back
+from core.services.user_progress import create_progress_for_case
+from core.users.models import Case, User, UserProgress
+from django.core.management.base import BaseCommand
+
+
+def _legacy_create_progress_for_case(case):
+    users = User.objects.using("users").all()
+    progresses = [
+        UserProgress(user=user, case=case)
+        for user in users
+        if not UserProgress.objects.using("users").filter(user=user, case=case).exists()
+    ]
+    UserProgress.objects.using("users").bulk_create(progresses, ignore_conflicts=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет время создания прогресса для нового дела при разном числе "
+        "пользователей (до и после). Все изменения откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 1_000_000],
+            help="Число пользователей в прогонах",
+        )
+        parser.add_argument(
+            "--legacy-max-users",
+            type=int,
+            default=10_000,
+            help="Не запускать старую реализацию на большем числе пользователей",
+        )
+
+    def handle(self, *args, **options):
+        for count in options["users"]:
+            timings = [("set-based", create_progress_for_case)]
+            if count <= options["legacy_max_users"]:
+                timings.insert(0, ("per-user exists()", None))
+
+            for label, fan_out in timings:
+                elapsed = self.measure(count, fan_out)
+                self.stdout.write(f"{count:>9} users  {label:<18} {elapsed:8.2f} s")
+
+    def measure(self, count, fan_out):
+        with rolled_back("users"):
+            self.create_users(count)
+            # bulk_create skips post_save, so the signal fan-out stays idle.
+            case = Case.objects.using("users").bulk_create(
+                [
+                    Case(
+                        title="benchmark fan-out",
+                        description="",
+                        required_xp=0,
+                        reward_xp=0,
+                        answer="",
+                    )
+                ]
+            )[0]
+
+            start = time.perf_counter()
+            if fan_out is None:
+                _legacy_create_progress_for_case(case)
+            else:
+                fan_out(case.pk)
+            elapsed = time.perf_counter() - start
+        return elapsed
+
+    def create_users(self, count, batch_size=10_000):
+        for offset in range(0, count, batch_size):
+            User.objects.using("users").bulk_create(
+                [
+                    User(username=f"benchmark-{i}", password="!")
+                    for i in range(offset, min(offset + batch_size, count))
+                ]
+            )
@@ -0,0 +1,158 @@
+import re
+import statistics
+import time
+
+import sqlparse
+from core.services.sql_executor import validate_and_prepare_query
+from django.core.management.base import BaseCommand
+from sqlglot import exp, parse
+from sqlparse.tokens import DML, Keyword
+
+ALLOWED_TABLES = {
+    "cases",
+    "person",
+    "suspect",
+    "suspect_cases",
+    "crime_scene",
+    "evidence",
+    "alibi",
+    "statement",
+    "charge",
+    "article",
+}
+
+QUERIES = [
+    "SELECT * FROM cases WHERE id = 70",
+    "SELECT * FROM person WHERE id = 337",
+    "SELECT id, name, description FROM person WHERE description ILIKE '%рыжие%'",
+    "SELECT p.id, p.name FROM person p JOIN suspect s ON s.person_id = p.id",
+    "SELECT * FROM crime_scene cs JOIN evidence e ON e.scene_id = cs.id "
+    "WHERE cs.case_id = 70",
+    "SELECT p.name, a.status, a.description FROM alibi a "
+    "JOIN suspect s ON s.id = a.suspect_id JOIN person p ON p.id = s.person_id "
+    "WHERE a.case_id = 70 AND a.status <> 'подтверждено'",
+    "SELECT p.id, p.name FROM person p WHERE p.description ILIKE '%татуировка%' "
+    "AND p.description ILIKE '%рыжие%' AND p.id IN "
+    "(SELECT s.person_id FROM suspect s JOIN suspect_cases sc "
+    "ON sc.suspect_id = s.id WHERE sc.case_id = 70)",
+    "SELECT c.type, COUNT(*) FROM cases c GROUP BY c.type ORDER BY 2 DESC",
+    "SELECT st.statement, st.date_of_statement FROM statement st "
+    "WHERE st.case_id = 70 ORDER BY st.date_of_statement LIMIT 20",
+    "WITH s AS (SELECT person_id FROM suspect WHERE status = 'на свободе') "
+    "SELECT p.* FROM person p JOIN s ON s.person_id = p.id",
+    "SELECT * FROM evidence WHERE description LIKE '%Роттердам%';",
+    "SELECT * FROM person; DROP TABLE person",
+    "DELETE FROM person WHERE id = 1",
+    "SELECT * FROM users_user",
+]
+
+_LEGACY_FORBIDDEN_KEYWORDS = {
+    "INSERT",
+    "UPDATE",
+    "DELETE",
+    "DROP",
+    "ALTER",
+    "TRUNCATE",
+    "CREATE",
+    "REPLACE",
+    "GRANT",
+    "REVOKE",
+    "INTO",
+    "MERGE",
+    "CALL",
+    "EXEC",
+}
+
+_LEGACY_FORBIDDEN_PATTERNS = [r"--", r"/\*.*\*/", r";", r"\bRECURSIVE\b", r"\bINTO\b"]
+
+
+def _legacy_has_limit(token_list) -> bool:
+    for token in token_list.tokens:
+        if token.ttype is Keyword and token.value.upper() == "LIMIT":
+            return True
+        elif token.is_group and _legacy_has_limit(token):
+            return True
+    return False
+
+
+def _legacy_contains_forbidden_keywords(token_list) -> bool:
+    for token in token_list.tokens:
+        if (
+            token.ttype in (Keyword, DML)
+            and token.value.upper() in _LEGACY_FORBIDDEN_KEYWORDS
+        ):
+            return True
+        elif token.is_group and _legacy_contains_forbidden_keywords(token):
+            return True
+    return False
+
+
+def _legacy_validate_and_prepare_query(raw_sql, allowed_user_tables):
+    cleaned_sql = (
+        sqlparse.format(raw_sql.strip(), strip_comments=True).strip().rstrip(";")
+    )
+    parsed = sqlparse.parse(cleaned_sql)
+    if not parsed:
+        raise ValueError("Пустой или некорректный SQL-запрос.")
+
+    statement = parsed[0]
+    if statement.get_type() != "SELECT":
+        raise ValueError("Разрешён только SELECT-запрос.")
+
+    for pattern in _LEGACY_FORBIDDEN_PATTERNS:
+        if re.search(pattern, cleaned_sql, flags=re.IGNORECASE | re.DOTALL):
+            raise ValueError("Запрос содержит запрещённые конструкции.")
+
+    if _legacy_contains_forbidden_keywords(statement):
+        raise ValueError("Запрос содержит запрещённые SQL-операции.")
+
+    try:
+        tables = {
+            t.name for tree in parse(cleaned_sql) for t in tree.find_all(exp.Table)
+        }
+    except Exception:
+        tables = set()
+    for table in tables:
+        if table and table not in allowed_user_tables:
+            raise ValueError(f"Доступ к таблице '{table}' в этом кейсе запрещён.")
+
+    if not _legacy_has_limit(statement):
+        cleaned_sql += " LIMIT 1000"
+    return cleaned_sql
+
+
+class Command(BaseCommand):
+    help = "Измеряет время валидации SQL-запросов игроков (до и после)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rounds", type=int, default=200, help="Количество прогонов корпуса"
+        )
+
+    def handle(self, *args, **options):
+        rounds = options["rounds"]
+        validators = [
+            ("sqlparse + sqlglot", _legacy_validate_and_prepare_query),
+            ("sqlglot single pass", validate_and_prepare_query),
+        ]
+
+        for label, validator in validators:
+            timings = self.measure(validator, rounds)
+            self.stdout.write(
+                f"{label:<22} "
+                f"mean={statistics.fmean(timings) * 1e6:8.1f} us  "
+                f"p50={statistics.median(timings) * 1e6:8.1f} us  "
+                f"p99={statistics.quantiles(timings, n=100)[98] * 1e6:8.1f} us"
+            )
+
+    def measure(self, validator, rounds):
+        timings = []
+        for _ in range(rounds):
+            for query in QUERIES:
+                start = time.perf_counter()
+                try:
+                    validator(query, ALLOWED_TABLES)
+                except ValueError:
+                    pass
+                timings.append(time.perf_counter() - start)
+        return timings
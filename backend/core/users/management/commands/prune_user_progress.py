@@ -0,0 +1,42 @@
+from core.services.resource_versions import CASES, bump_resource_version
+from core.users.models import UserProgress
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет строки прогресса со статусом «не начато». "
+        "Используется при переходе на USER_PROGRESS_LAZY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10_000,
+            help="Сколько строк удалять за одну транзакцию",
+        )
+
+    def handle(self, *args, **options):
+        table = UserProgress._meta.db_table
+        # Plain DELETE in batches: queryset.delete() would load every row
+        # to send post_delete signals and hold one long transaction.
+        sql = (
+            f"DELETE FROM {table} WHERE id IN "
+            f"(SELECT id FROM {table} WHERE status = %s LIMIT %s)"
+        )
+
+        deleted = 0
+        while True:
+            with transaction.atomic(using="users"):
+                with connections["users"].cursor() as cursor:
+                    cursor.execute(sql, ["не начато", options["batch_size"]])
+                    batch = cursor.rowcount
+            deleted += batch
+            if batch < options["batch_size"]:
+                break
+
+        # Progress ETags include the case list version.
+        bump_resource_version(CASES)
+        self.stdout.write(self.style.SUCCESS(f"Удалено строк прогресса: {deleted}"))
@@ -0,0 +1,21 @@
+from core.services.leaderboard import rebuild
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Пересобирает рейтинг игроков по опыту из таблицы users_user"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10_000,
+            help="Сколько пользователей читать и записывать за раз",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            count = rebuild(options["batch_size"])
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+        self.stdout.write(self.style.SUCCESS(f"Игроков в рейтинге: {count}"))
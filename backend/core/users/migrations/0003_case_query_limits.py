@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_xp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='case',
+            name='max_bytes',
+            field=models.PositiveIntegerField(blank=True, help_text='Максимальный размер результата, байт.', null=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='max_rows',
+            field=models.PositiveIntegerField(blank=True, help_text='Максимальное число строк в результате.', null=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='statement_timeout',
+            field=models.PositiveIntegerField(blank=True, help_text='Лимит времени SQL-запроса игрока, мс.', null=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='work_mem',
+            field=models.PositiveIntegerField(blank=True, help_text='Лимит work_mem для SQL-запроса игрока, КБ.', null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_case_query_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='case',
+            name='max_cost',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Максимальная оценка стоимости плана запроса.', null=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='max_plan_rows',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Максимальная оценка числа строк плана.', null=True),
+        ),
+    ]
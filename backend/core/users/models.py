@@ -25,6 +25,24 @@ class Case(models.Model):
     required_xp = models.IntegerField(validators=[MinValueValidator(0)])
     reward_xp = models.IntegerField(validators=[MinValueValidator(0)])
     answer = models.CharField(max_length=50)
+    statement_timeout = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Лимит времени SQL-запроса игрока, мс."
+    )
+    work_mem = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Лимит work_mem для SQL-запроса игрока, КБ."
+    )
+    max_rows = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Максимальное число строк в результате."
+    )
+    max_bytes = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Максимальный размер результата, байт."
+    )
+    max_cost = models.PositiveBigIntegerField(
+        null=True, blank=True, help_text="Максимальная оценка стоимости плана запроса."
+    )
+    max_plan_rows = models.PositiveBigIntegerField(
+        null=True, blank=True, help_text="Максимальная оценка числа строк плана."
+    )
 
     def __str__(self):
         return f"Case {self.pk} - {self.title}"
@@ -1,43 +1,49 @@
+from django.conf import settings
 from django.db import IntegrityError, transaction
 from django.db.models import F
 from django.db.models.functions import Greatest
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from core.users.models import Case, User, UserProgress
+from core.services import leaderboard
+from core.services.access_cache import invalidate_case, invalidate_user_xp
+from core.services.query_cache import (
+    invalidate_allowed_tables,
+    invalidate_query_limits,
+)
+from core.services.resource_versions import (
+    CASES,
+    bump_resource_version,
+    user_progress,
+)
+from core.services.user_progress import (
+    create_progress_for_case,
+    create_progress_for_user,
+)
+from core.users.models import AvailableTable, Case, User, UserProgress
+from core.users.tasks import create_case_progress
 
 
 @receiver(post_save, sender=Case)
 @transaction.atomic(using="users")
 def create_userprogress_for_all_users(sender, instance, created, **kwargs):
-    if created:
-        users = User.objects.using("users").all()
-        progresses = [
-            UserProgress(user=user, case=instance)
-            for user in users
-            if not UserProgress.objects.using("users")
-            .filter(user=user, case=instance)
-            .exists()
-        ]
-        UserProgress.objects.using("users").bulk_create(
-            progresses, ignore_conflicts=True
-        )
+    if created and not settings.USER_PROGRESS_LAZY:
+        min_users = settings.USER_PROGRESS_ASYNC_FAN_OUT_MIN_USERS
+        if min_users and User.objects.using("users").count() >= min_users:
+            case_id = instance.pk
+            transaction.on_commit(
+                lambda: create_case_progress.delay(case_id), using="users"
+            )
+        else:
+            create_progress_for_case(instance.pk)
+
 
 @receiver(post_save, sender=User)
 @transaction.atomic(using="users")
 def create_userprogress_for_new_user(sender, instance, created, **kwargs):
-    if created:
-        cases = Case.objects.using("users").all()
-        progresses = [
-            UserProgress(user=instance, case=case)
-            for case in cases
-            if not UserProgress.objects.using("users")
-            .filter(user=instance, case=case)
-            .exists()
-        ]
-        UserProgress.objects.using("users").bulk_create(
-            progresses, ignore_conflicts=True
-        )
+    if created and not settings.USER_PROGRESS_LAZY:
+        create_progress_for_user(instance.pk)
+
 
 @receiver(pre_delete, sender=Case)
 @transaction.atomic(using="users")
@@ -52,5 +58,56 @@ def deduct_xp_on_case_deletion(sender, instance, **kwargs):
             User.objects.using("users").filter(id__in=user_ids).update(
                 xp=Greatest(F("xp") - instance.reward_xp, 0)
             )
+            transaction.on_commit(lambda: invalidate_user_xp(*user_ids), using="users")
+            transaction.on_commit(lambda: leaderboard.sync_xp(user_ids), using="users")
     except IntegrityError as e:
         raise IntegrityError(f"Error while deducting XP on case deletion: {str(e)}")
+
+
+@receiver(post_save, sender=AvailableTable)
+@receiver(post_delete, sender=AvailableTable)
+def invalidate_available_tables(sender, instance, **kwargs):
+    case_id = instance.case_id
+    transaction.on_commit(lambda: invalidate_allowed_tables(case_id), using="users")
+
+
+@receiver(post_save, sender=Case)
+@receiver(post_delete, sender=Case)
+def invalidate_case_query_limits(sender, instance, **kwargs):
+    case_id = instance.pk
+    transaction.on_commit(lambda: invalidate_query_limits(case_id), using="users")
+    transaction.on_commit(lambda: invalidate_case(case_id), using="users")
+
+
+@receiver(post_save, sender=Case)
+@receiver(post_delete, sender=Case)
+def bump_case_list_version(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_resource_version(CASES), using="users")
+
+
+# No post_delete receiver: it would make every case and user deletion load
+# and signal its progress rows one by one instead of a single DELETE.
+# Deleted cases already bump CASES, which every progress ETag includes.
+@receiver(post_save, sender=UserProgress)
+def bump_user_progress_version(sender, instance, **kwargs):
+    resource = user_progress(instance.user_id)
+    transaction.on_commit(lambda: bump_resource_version(resource), using="users")
+
+
+@receiver(post_delete, sender=User)
+def bump_deleted_user_progress_version(sender, instance, **kwargs):
+    resource = user_progress(instance.pk)
+    transaction.on_commit(lambda: bump_resource_version(resource), using="users")
+
+
+@receiver(post_save, sender=User)
+def add_user_to_leaderboard(sender, instance, created, **kwargs):
+    if created:
+        user_id = instance.pk
+        transaction.on_commit(lambda: leaderboard.sync_xp([user_id]), using="users")
+
+
+@receiver(post_delete, sender=User)
+def remove_user_from_leaderboard(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: leaderboard.sync_xp([user_id]), using="users")
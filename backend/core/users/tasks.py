@@ -1,11 +1,18 @@
 from core.celery_app import app
 from core.services.sql_executor import run_validated_sql_query
+from core.services.user_progress import create_progress_for_case
 
 
 @app.task()
-def execute_safe_sql(user_id, case_id, raw_sql):
+def execute_safe_sql(user_id, case_id, raw_sql, page_token=None):
     try:
-        result = run_validated_sql_query(user_id, case_id, raw_sql)
+        result = run_validated_sql_query(user_id, case_id, raw_sql, page_token)
         return result
     except Exception as e:
         return {"error": str(e)}
+
+
+# Fan-outs over all users may take longer than CELERY_TASK_TIME_LIMIT.
+@app.task(time_limit=600)
+def create_case_progress(case_id):
+    return create_progress_for_case(case_id)
@@ -7,7 +7,14 @@ urlpatterns = [
         "api/",
         include(
             [
-                path("userprogress/", views.UserProgressListView.as_view(), name="user_progress"),
+                path(
+                    "userprogress/",
+                    views.UserProgressListView.as_view(),
+                    name="user_progress",
+                ),
+                path(
+                    "leaderboard/", views.LeaderboardView.as_view(), name="leaderboard"
+                ),
                 path(
                     "cases/",
                     include(
@@ -38,6 +45,11 @@ urlpatterns = [
                         ]
                     ),
                 ),
+                path(
+                    "health/player-pool/",
+                    views.PlayerPoolStatsView.as_view(),
+                    name="player_pool_stats",
+                ),
                 path(
                     "sql-task/<str:task_id>/",
                     views.TaskStatusView.as_view(),
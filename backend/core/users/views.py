@@ -1,58 +1,175 @@
 import json
 import logging
+import time
 
+from celery.exceptions import TimeoutError as TaskTimeoutError
 from celery.result import AsyncResult
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from psycopg2 import DatabaseError, InterfaceError, OperationalError
+from psycopg2.errors import QueryCanceled
+from redis import RedisError
 from rest_framework import status
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from core.celery_app import app
+from core.services import leaderboard
 from core.services.answer_checker import check_answer
-from core.services.schema_creator import get_schema
+from core.services.connection_pool import PoolTimeout, get_player_pool_stats
+from core.services.resource_versions import (
+    CASES,
+    get_resource_versions,
+    user_progress,
+)
+from core.services.schema_creator import get_schema_snapshot
+from core.services.sql_executor import QueryLimitExceeded, admit_query, run_inline
+from core.services.user_progress import get_user_progress
 from core.users.decorators import validate_case_access
 from core.users.models import Case as Case
-from core.users.models import User, UserProgress
+from core.users.models import UserProgress
 from core.users.tasks import execute_safe_sql
 
 logger = logging.getLogger(__name__)
 
+# Failures of the investigations database itself rather than of the query.
+CONNECTION_ERRORS = (PoolTimeout, OperationalError, InterfaceError)
+
+
+def service_unavailable(error):
+    """Answer 503 and ask the client to retry after SQL_RETRY_AFTER."""
+    return Response(
+        {"error": str(error)},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(settings.SQL_RETRY_AFTER)},
+    )
+
+
+def conditional_response(request, etag, get_data, last_modified=None):
+    """
+    Answer a GET with 304 if the client already has the current version.
+
+    ``get_data`` is only called when the full response is needed, so an
+    unchanged resource costs no database queries. If-None-Match takes
+    precedence over If-Modified-Since.
+
+    Args:
+        request: The current request.
+        etag: Unquoted entity tag of the current version.
+        get_data: Callable returning the response payload.
+        last_modified: Optional Unix time of the last change.
+    """
+    etag = quote_etag(etag)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        # Weak comparison over a list of tags or "*", see RFC 9110 13.1.2.
+        tags = {tag.removeprefix("W/") for tag in parse_etags(if_none_match)}
+        not_modified = "*" in tags or etag in tags
+    else:
+        since = parse_http_date_safe(request.headers.get("If-Modified-Since"))
+        not_modified = (
+            last_modified is not None and since is not None and last_modified <= since
+        )
+
+    if not_modified:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(get_data(), headers=headers)
+
+
+def versioned_response(request, resources, get_data):
+    """
+    Conditional response for data whose changes bump the given resources.
+
+    Versions are in nanoseconds and Last-Modified in whole seconds, so it
+    is rounded up and only sent once that second is over: otherwise a
+    second change within the same second would get the same date and a
+    304 from If-Modified-Since.
+    """
+    versions = get_resource_versions(*resources)
+    last_modified = -(-max(versions) // 10**9)
+    if last_modified * 10**9 > time.time_ns():
+        last_modified = None
+    return conditional_response(
+        request,
+        "-".join(map(str, versions)),
+        get_data,
+        last_modified=last_modified,
+    )
+
 
 class SchemaView(APIView):
     @validate_case_access
     def get(self, request, case_id):
         try:
-            schema = get_schema(case_id)
-            return Response(schema)
+            snapshot = get_schema_snapshot(case_id)
+            return conditional_response(
+                request, snapshot["etag"], lambda: snapshot["schema"]
+            )
         except ObjectDoesNotExist as e:
             return Response({"error": str(e)}, status=404)
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
 
 class ExecuteSQLView(APIView):
     @validate_case_access
     def post(self, request, case_id):
         sql = request.data.get("sql", "").strip()
-        if not sql:
+        page_token = request.data.get("page_token")
+        if not sql and not page_token:
             return Response(
                 {"error": "Поле 'sql' не может быть пустым"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        user = User.objects.get(id=request.user.id)
+        user_id = request.user.id
         case = request.case
 
-        try:
-            UserProgress.objects.get(user=user, case=case)
-        except UserProgress.DoesNotExist:
+        # With lazy progress a missing row just means "не начато"; it is
+        # written once the player answers, see check_answer.
+        if (
+            not settings.USER_PROGRESS_LAZY
+            and not UserProgress.objects.filter(
+                user_id=user_id, case_id=case.id
+            ).exists()
+        ):
             return Response(
                 {"error": "Прогресс по делу не найден"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        # Reject invalid and too expensive queries before they take a worker.
+        # statement_timeout is an OperationalError too, but the query's fault.
+        try:
+            query = admit_query(case.id, sql, page_token)
+        except (ValueError, QueryLimitExceeded, QueryCanceled) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except CONNECTION_ERRORS as e:
+            return service_unavailable(e)
+        except DatabaseError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Cheap queries are answered right away, without the Celery round trip.
         try:
-            task = execute_safe_sql.delay(user.id, case.id, sql)
+            result = run_inline(case.id, query)
+        except CONNECTION_ERRORS as e:
+            return service_unavailable(e)
+        if result is not None:
+            return Response({"status": "SUCCESS", "result": result})
+
+        try:
+            task = execute_safe_sql.delay(user_id, case.id, sql, page_token)
         except Exception as e:
             return Response(
                 {"error": f"Ошибка запуска задачи: {str(e)}"},
@@ -66,6 +183,16 @@ class TaskStatusView(APIView):
     def get(self, request, task_id):
         result = AsyncResult(task_id, app=app)
 
+        # Long polling: with ?wait=<seconds> the response is held until the
+        # task finishes. The Redis result backend notifies the waiter via
+        # pub/sub, so the client needs one request instead of many polls.
+        wait = self.get_wait_timeout(request)
+        if wait and not result.ready():
+            try:
+                result.get(timeout=wait, propagate=False)
+            except TaskTimeoutError:
+                pass
+
         if result.status == "SUCCESS":
             value = result.result
             if isinstance(value, str):
@@ -80,6 +207,14 @@ class TaskStatusView(APIView):
 
         return Response({"status": result.status})
 
+    @staticmethod
+    def get_wait_timeout(request) -> float:
+        try:
+            wait = float(request.query_params.get("wait", 0))
+        except ValueError:
+            return 0
+        return max(0, min(wait, settings.SQL_TASK_MAX_WAIT))
+
 
 class SubmitAnswerView(APIView):
     @validate_case_access
@@ -91,17 +226,105 @@ class SubmitAnswerView(APIView):
         return Response({"correct": success})
 
 
+class CaseListPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
 class CaseListView(APIView):
+    # "answer" is never listed, heavy text only on request via ?fields=.
+    FIELDS = {
+        "id",
+        "title",
+        "short_description",
+        "description",
+        "required_xp",
+        "reward_xp",
+        "status",
+    }
+    DEFAULT_FIELDS = [
+        "id",
+        "title",
+        "short_description",
+        "required_xp",
+        "reward_xp",
+        "status",
+    ]
+
     def get(self, request):
-        cases = Case.objects.using("users").values()
-        return Response(cases)
+        fields = request.query_params.get("fields")
+        fields = fields.split(",") if fields else self.DEFAULT_FIELDS
+        unknown = set(fields) - self.FIELDS
+        if unknown:
+            return Response(
+                {"error": f"Неизвестные поля: {', '.join(sorted(unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
+        # The user's status is part of the page, so it depends on progress too.
+        return versioned_response(
+            request,
+            [CASES, user_progress(request.user.id)],
+            lambda: self.get_page(request, fields),
+        )
 
-class UserProgressListView(APIView):
+    def get_page(self, request, fields):
+        status_subquery = UserProgress.objects.filter(
+            case_id=OuterRef("pk"), user_id=request.user.id
+        ).values("status")[:1]
+        cases = (
+            Case.objects.using("users")
+            .annotate(status=Coalesce(Subquery(status_subquery), Value("не начато")))
+            .order_by("id")
+            .values(*fields)
+        )
+        paginator = CaseListPagination()
+        page = paginator.paginate_queryset(cases, request, view=self)
+        return paginator.get_paginated_response(page).data
+
+
+class LeaderboardView(APIView):
     def get(self, request):
-        progress = list(
-            UserProgress.objects.filter(user_id=request.user.id).values(
-                "case_id", "status"
+        limit = self.get_int_param(request, "limit", 10, 100)
+        neighbours = self.get_int_param(request, "neighbours", 2, 10)
+        try:
+            return Response(
+                {
+                    "top": leaderboard.get_top(limit),
+                    "me": leaderboard.get_user_standing(request.user.id, neighbours),
+                }
             )
+        except RedisError:
+            logger.exception("Leaderboard read failed")
+            return Response(
+                {"error": "Рейтинг временно недоступен"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+    @staticmethod
+    def get_int_param(request, name, default, maximum) -> int:
+        try:
+            value = int(request.query_params.get(name, default))
+        except ValueError:
+            return default
+        return max(1, min(value, maximum))
+
+
+class UserProgressListView(APIView):
+    def get(self, request):
+        # New cases add progress rows in bulk, without per-row signals.
+        return versioned_response(
+            request,
+            [CASES, user_progress(request.user.id)],
+            lambda: get_user_progress(request.user.id),
         )
-        return Response(progress)
+
+
+class PlayerPoolStatsView(APIView):
+    """Connection pool metrics of the serving process, for monitoring."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"player_pool": get_player_pool_stats()})
@@ -116,48 +116,33 @@ function HomeContent() {
       console.log('Пробуем загрузить с токеном:', localStorage.getItem('token'));
       
       try {
-        const response = await fetch('https://sqlhunt.com:8000/api/cases/', {
-          headers: {
-            'Authorization': `Bearer ${localStorage.getItem('token')}`,
-            'Accept': 'application/json'
-          }
-        });
-
-        if (!response.ok) {
-          throw new Error('Failed to fetch cases');
-        }
+        // Список дел приходит постранично, вместе со статусом прохождения
+        const casesData: any[] = [];
+        let nextUrl: string | null =
+          'https://sqlhunt.com:8000/api/cases/?page_size=100&fields=id,title,short_description,description,required_xp,reward_xp,status';
+
+        while (nextUrl) {
+          const response = await fetch(nextUrl, {
+            headers: {
+              'Authorization': `Bearer ${localStorage.getItem('token')}`,
+              'Accept': 'application/json'
+            }
+          });
 
-        const casesData = await response.json();
-        
-        // Получаем прогресс пользователя
-        const progressResponse = await fetch('https://sqlhunt.com:8000/api/userprogress/', {
-          headers: {
-            'Authorization': `Bearer ${localStorage.getItem('token')}`,
-            'Accept': 'application/json'
+          if (!response.ok) {
+            throw new Error('Failed to fetch cases');
           }
-        });
 
-        if (!progressResponse.ok) {
-          throw new Error('Failed to fetch user progress');
+          const page = await response.json();
+          casesData.push(...page.results);
+          nextUrl = page.next;
         }
 
-        const progressData = await progressResponse.json();
-        
-        // Добавляем детальное отладочное логирование
-        console.log('Прогресс пользователя (детально):', JSON.stringify(progressData, null, 2));
-        console.log('Пример первой записи:', progressData[0]);
-        console.log('Доступные поля в записи:', progressData[0] ? Object.keys(progressData[0]) : 'Нет данных');
-        
-        // Создаем Set с ID завершенных дел (проверяем оба варианта статуса)
+        // Создаем Set с ID завершенных дел
         const completedCases = new Set(
-          progressData
-            .filter((progress: any) => 
-              progress.status === 'Завершено' || 
-              progress.status === 'завершено' ||
-              progress.state === 'Завершено' ||
-              progress.state === 'завершено'
-            )
-            .map((progress: any) => progress.case_id)
+          casesData
+            .filter((item: any) => item.status === 'завершено')
+            .map((item: any) => item.id)
         );
         
         // Логируем завершенные дела
@@ -732,6 +732,26 @@ export const ExpandedCaseContent = memo(function ExpandedCaseContent({
         }
       }
 
+      // Быстрые запросы сервер выполняет сразу и возвращает результат в ответе
+      if (response.status === 200 && data.status === 'SUCCESS') {
+        if (!data.result) {
+          throw new Error('Получен пустой результат от сервера');
+        }
+
+        if (data.result.error) {
+          throw new Error(data.result.error);
+        }
+
+        if (!Array.isArray(data.result.columns) || !Array.isArray(data.result.rows)) {
+          throw new Error('Некорректный формат результата запроса');
+        }
+
+        window.console.log('[SQL Execute] Запрос выполнен без очереди');
+        setQueryResult(data.result);
+        setError(null);
+        return;
+      }
+
       if (!data || !data.task_id) {
         throw new Error('Сервер не вернул идентификатор задачи');
       }
@@ -750,7 +770,8 @@ export const ExpandedCaseContent = memo(function ExpandedCaseContent({
         try {
           window.console.log(`[Task Status] Попытка ${attempts + 1}/${maxAttempts} для задачи ${taskId}`);
           
-          const statusResponse = await fetch(`https://sqlhunt.com:8000/api/sql-task/${taskId}/`, {
+          // Сервер держит запрос до завершения задачи (long polling), до 25 секунд
+          const statusResponse = await fetch(`https://sqlhunt.com:8000/api/sql-task/${taskId}/?wait=25`, {
             headers: {
               'Authorization': `Bearer ${token}`,
               'Accept': 'application/json'
@@ -802,7 +823,6 @@ export const ExpandedCaseContent = memo(function ExpandedCaseContent({
             throw new Error(statusData.error || 'Задача завершилась с ошибкой');
           } else if (statusData.status === 'PENDING' || statusData.status === 'STARTED') {
             window.console.log(`[Task Status] Задача ${statusData.status}, ожидаем...`);
-            await new Promise(resolve => setTimeout(resolve, retryDelay));
             attempts++;
             continue;
           } else {